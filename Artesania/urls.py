@@ -1,9 +1,19 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.shortcuts import redirect
 
+from main import imagenes, views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', lambda request: redirect('public_view'), name='root'),
     path('', include('main.urls')),
 ]
+
+# Fotos de productos (solo las variantes que genera imagenes.py: <hash>-<ancho>.jpg/.webp)
+if settings.SERVIR_MEDIA:
+    urlpatterns.append(re_path(
+        r'^%s%s/(?P<nombre>[0-9a-f]+-\d+\.(?:jpg|webp))$' % (settings.MEDIA_URL.lstrip('/'), imagenes.CARPETA),
+        views.media_producto, name='media_producto',
+    ))
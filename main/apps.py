@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class MainConfig(AppConfig):
+    name = 'main'
+
+    def ready(self):
+        # señales que borran el usuario cacheado y las fotos de productos borrados:
+        # tienen que estar también en los comandos de manage.py, que no cargan las vistas
+        from . import autenticacion, imagenes  # noqa: F401
@@ -0,0 +1,135 @@
+"""
+Archivo histórico de ferias.
+
+Las ferias terminadas (fecha_fin ya pasó) salen del documento "caliente" junto
+con sus artesanos y solicitudes, y también las solicitudes resueltas (aceptadas o
+rechazadas) de más de DIAS_SOLICITUDES días. Se guardan en
+main/data/archivo/ferias-<año>.json con la misma estructura y formato que
+ferias.json, así se pueden consultar desde el panel admin.
+
+utils.archivar / db_store.archivar deciden qué mover (seleccionar) y lo quitan
+de su backend; aquí solo se arman los lotes y se leen/escriben los archivos.
+"""
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import json_store
+
+DIAS_SOLICITUDES = 180
+COLECCIONES = ("ferias", "artesanos", "solicitudes")
+
+_NOMBRE = re.compile(r"^ferias-(\d{4})\.json$")
+_cache = {}  # ruta -> (firma, documento)
+_lock = threading.Lock()
+
+
+def carpeta():
+    return os.path.join(os.path.dirname(json_store.DATA_FILE), "archivo")
+
+
+def _ruta(anio):
+    return os.path.join(carpeta(), f"ferias-{int(anio)}.json")
+
+
+def _vacio():
+    return {c: [] for c in COLECCIONES}
+
+
+def anios():
+    """Años con archivo, del más reciente al más viejo."""
+    try:
+        nombres = os.listdir(carpeta())
+    except FileNotFoundError:
+        return []
+    return sorted((int(m.group(1)) for m in map(_NOMBRE.match, nombres) if m), reverse=True)
+
+
+def leer(anio):
+    """Documento archivado de un año (de SOLO LECTURA; cacheado mientras el archivo no cambie)."""
+    ruta = _ruta(anio)
+    try:
+        st = os.stat(ruta)
+    except FileNotFoundError:
+        return _vacio()
+    firma = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _lock:
+        previo = _cache.get(ruta)
+        if previo and previo[0] == firma:
+            return previo[1]
+        with open(ruta, "rb") as f:
+            doc = json_store._decodificar(f.read())
+        for c in COLECCIONES:
+            doc.setdefault(c, [])
+        _cache[ruta] = (firma, doc)
+        return doc
+
+
+def seleccionar(data, hoy=None, dias=DIAS_SOLICITUDES):
+    """
+    {año: {"ferias", "artesanos", "solicitudes"}} con lo que hay que archivar del documento.
+    Lo de una feria terminada va al año de su fecha_fin (también sus solicitudes
+    pendientes: ya no se pueden aprobar); las solicitudes sueltas, al año en que se crearon.
+    """
+    hoy = hoy or date.today()
+    limite = hoy - timedelta(days=dias)
+
+    terminadas = {}
+    for f in data["ferias"]:
+        fin = parse_date(f.get("fecha_fin") or "")
+        if fin is not None and fin < hoy:
+            terminadas[int(f["id"])] = fin.year
+
+    lotes = {}
+
+    def lote(anio):
+        return lotes.setdefault(anio, _vacio())
+
+    for f in data["ferias"]:
+        if int(f["id"]) in terminadas:
+            lote(terminadas[int(f["id"])])["ferias"].append(f)
+    for a in data["artesanos"]:
+        anio = terminadas.get(int(a.get("feria_id", -1)))
+        if anio is not None:
+            lote(anio)["artesanos"].append(a)
+    for s in data["solicitudes"]:
+        anio = terminadas.get(int(s.get("feria_id", -1)))
+        if anio is None and s.get("estado") in ("aceptado", "rechazado"):
+            creado = parse_datetime(s.get("creado") or "")
+            if creado is not None and creado.date() < limite:
+                anio = creado.year
+        if anio is not None:
+            lote(anio)["solicitudes"].append(s)
+    return lotes
+
+
+def ids(lotes):
+    """{colección: set de ids} de todos los lotes."""
+    out = {c: set() for c in COLECCIONES}
+    for lote in lotes.values():
+        for c in COLECCIONES:
+            out[c].update(int(x["id"]) for x in lote[c])
+    return out
+
+
+def conteo(lotes):
+    """{año: {colección: cantidad}}, para informar."""
+    return {anio: {c: len(lote[c]) for c in COLECCIONES} for anio, lote in sorted(lotes.items())}
+
+
+def guardar(lotes):
+    """
+    Agrega los lotes a los archivos de cada año (reemplazando por id lo que ya
+    estuviera, así repetir un archivado a medias no duplica nada).
+    """
+    for anio, lote in lotes.items():
+        doc = leer(anio)
+        nuevo = {}
+        for c in COLECCIONES:
+            por_id = {int(x["id"]): x for x in doc[c]}
+            por_id.update((int(x["id"]), x) for x in lote[c])
+            nuevo[c] = sorted(por_id.values(), key=lambda x: int(x["id"]))
+        json_store._escribir_atomico(_ruta(anio), json_store._codificar(nuevo))
@@ -0,0 +1,35 @@
+"""
+Usuario logueado cacheado.
+
+AuthenticationMiddleware pide el usuario de la sesión al backend en cada request
+(un SELECT antes de llegar a la vista). ModelBackendConCache lo guarda en el cache
+de Django USUARIO_CACHE_TIMEOUT segundos; guardar o borrar el usuario (login,
+cambio de clave o de rol, desactivarlo) lo saca del cache.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+def _clave(user_id):
+    return f"usuario:{user_id}"
+
+
+class ModelBackendConCache(ModelBackend):
+    def get_user(self, user_id):
+        if not settings.USUARIO_CACHE_TIMEOUT:
+            return super().get_user(user_id)
+        user = cache.get(_clave(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(_clave(user_id), user, settings.USUARIO_CACHE_TIMEOUT)
+        return user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _usuario_cambiado(sender, instance, **kwargs):
+    cache.delete(_clave(instance.pk))
@@ -0,0 +1,207 @@
+"""
+Búsqueda de texto de la página pública.
+
+Índice invertido en memoria sobre ferias y artesanos (documento de ferias.json)
+y productos (tabla Producto): tokens en minúsculas y sin tildes, prefijos
+("cera" encuentra "Cerámica") y ranking por campo (nombre > etiquetas > descripción).
+
+El índice se mantiene de a poco: cuando cambia la versión de datos solo se re-tokenizan
+los registros cuyo texto cambió, y los productos se actualizan con señales (más un
+repaso cada PRODUCTOS_TTL segundos por si alguien los escribió desde otro proceso).
+Con FERIAS_BACKEND=db se usa la tabla FTS5 de SQLite (ver db_store.buscar_texto).
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import utils
+from .models import Artesano, Producto
+
+# peso de cada campo en el ranking
+PESOS = {"nombre": 3, "etiquetas": 2, "descripcion": 1}
+MAX_RESULTADOS = 500
+PRODUCTOS_TTL = 300
+
+_SEPARADOR = re.compile(r"[\W_]+")
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: "Cerámica Ñandú" -> "ceramica nandu"."""
+    texto = unicodedata.normalize("NFKD", str(texto or "").lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return [t for t in _SEPARADOR.split(normalizar(texto)) if t]
+
+
+class IndiceInvertido:
+    """término -> {clave: peso}; clave = (clase, id). Vocabulario ordenado para buscar por prefijo."""
+
+    def __init__(self):
+        self.postings = {}
+        self.terminos = []
+        self.docs = {}  # clave -> (campos indexados, términos)
+
+    def agregar(self, clave, campos):
+        """Indexa un documento; si ya estaba con el mismo texto no hace nada."""
+        firma = tuple(sorted(campos.items()))
+        previo = self.docs.get(clave)
+        if previo is not None:
+            if previo[0] == firma:
+                return
+            self.quitar(clave)
+
+        pesos = Counter()
+        for campo, texto in campos.items():
+            for t in tokenizar(texto):
+                pesos[t] += PESOS.get(campo, 1)
+        for t, peso in pesos.items():
+            posting = self.postings.get(t)
+            if posting is None:
+                posting = self.postings[t] = {}
+                bisect.insort(self.terminos, t)
+            posting[clave] = peso
+        self.docs[clave] = (firma, tuple(pesos))
+
+    def quitar(self, clave):
+        previo = self.docs.pop(clave, None)
+        if previo is None:
+            return
+        for t in previo[1]:
+            posting = self.postings.get(t)
+            if posting is None:
+                continue
+            posting.pop(clave, None)
+            if not posting:
+                del self.postings[t]
+                i = bisect.bisect_left(self.terminos, t)
+                if i < len(self.terminos) and self.terminos[i] == t:
+                    del self.terminos[i]
+
+    def _expandir(self, token):
+        """Términos del vocabulario que empiezan con token."""
+        i = bisect.bisect_left(self.terminos, token)
+        while i < len(self.terminos) and self.terminos[i].startswith(token):
+            yield self.terminos[i]
+            i += 1
+
+    def buscar(self, consulta, limite=MAX_RESULTADOS):
+        """
+        [(clave, puntaje)] de los documentos que contienen TODOS los tokens
+        (cada uno como palabra exacta o prefijo; la exacta vale el doble).
+        """
+        puntajes = None
+        for token in dict.fromkeys(tokenizar(consulta)):
+            parcial = {}
+            for termino in self._expandir(token):
+                factor = 2 if termino == token else 1
+                for clave, peso in self.postings[termino].items():
+                    if peso * factor > parcial.get(clave, 0):
+                        parcial[clave] = peso * factor
+            if puntajes is None:
+                puntajes = parcial
+            else:
+                puntajes = {k: v + parcial[k] for k, v in puntajes.items() if k in parcial}
+            if not puntajes:
+                return []
+        if puntajes is None:
+            return []
+        return sorted(puntajes.items(), key=lambda kv: (-kv[1], kv[0]))[:limite]
+
+
+# -------------------- Índice del proceso --------------------
+
+_indice = IndiceInvertido()
+_lock = threading.Lock()
+_estado = {"version": None, "productos": None}
+
+
+def _campos_feria(f):
+    return {
+        "nombre": f.get("nombre", ""),
+        "etiquetas": " ".join(tp.get("tipo", "") for tp in f.get("tipos_productos", [])),
+        "descripcion": f.get("preferencias", ""),
+    }
+
+
+def _campos_artesano(a):
+    return {"nombre": a.get("nombre", ""), "etiquetas": a.get("tipo", ""), "descripcion": a.get("descripcion", "")}
+
+
+def _campos_producto(p, artesano_nombre):
+    return {"nombre": p.nombre, "etiquetas": artesano_nombre, "descripcion": p.descripcion}
+
+
+def _sincronizar_documento(data):
+    """Pone el índice al día con el documento: solo re-tokeniza lo que cambió."""
+    vistos = set()
+    for clase, coleccion, campos in (("feria", "ferias", _campos_feria), ("artesano", "artesanos", _campos_artesano)):
+        for r in data[coleccion]:
+            clave = (clase, int(r.get("id")))
+            vistos.add(clave)
+            _indice.agregar(clave, campos(r))
+    for clave in [k for k in _indice.docs if k[0] != "producto" and k not in vistos]:
+        _indice.quitar(clave)
+
+
+def _sincronizar_productos():
+    vistos = set()
+    for p in Producto.objects.select_related("artesano").only("id", "nombre", "descripcion", "artesano__nombre"):
+        clave = ("producto", p.id)
+        vistos.add(clave)
+        _indice.agregar(clave, _campos_producto(p, p.artesano.nombre))
+    for clave in [k for k in _indice.docs if k[0] == "producto" and k not in vistos]:
+        _indice.quitar(clave)
+    _estado["productos"] = time.monotonic()
+
+
+def buscar_texto(consulta, limite=MAX_RESULTADOS):
+    """[(clase, id, puntaje)] por relevancia; clase = "feria" | "artesano" | "producto"."""
+    version, _ = utils.version_datos()
+    with _lock:
+        if _estado["version"] != version:
+            # solo ferias y artesanos, y solo cuando cambiaron (con FERIAS_BACKEND=db son consultas)
+            _sincronizar_documento({"ferias": utils.ferias(), "artesanos": utils.artesanos()})
+            _estado["version"] = version
+        if _estado["productos"] is None or time.monotonic() - _estado["productos"] > PRODUCTOS_TTL:
+            _sincronizar_productos()
+        return [(clase, rid, puntaje) for (clase, rid), puntaje in _indice.buscar(consulta, limite)]
+
+
+# Productos: el índice se corrige al guardar/borrar (solo si ya se armó; si no, lo arma la primera búsqueda)
+
+@receiver(post_save, sender=Producto)
+def _producto_guardado(sender, instance, **kwargs):
+    with _lock:
+        if _estado["productos"] is not None:
+            _indice.agregar(("producto", instance.pk), _campos_producto(instance, instance.artesano.nombre))
+
+
+def productos_guardados(productos, artesano_nombre):
+    """Para escrituras en bloque (bulk_create/bulk_update), que no disparan post_save."""
+    with _lock:
+        if _estado["productos"] is not None:
+            for p in productos:
+                _indice.agregar(("producto", p.pk), _campos_producto(p, artesano_nombre))
+
+
+@receiver(post_delete, sender=Producto)
+def _producto_borrado(sender, instance, **kwargs):
+    with _lock:
+        _indice.quitar(("producto", instance.pk))
+
+
+@receiver(post_save, sender=Artesano)
+def _artesano_guardado(sender, instance, **kwargs):
+    # el nombre del artesano está en las etiquetas de sus productos
+    with _lock:
+        if _estado["productos"] is not None:
+            for p in instance.productos.only("id", "nombre", "descripcion"):
+                _indice.agregar(("producto", p.id), _campos_producto(p, instance.nombre))
@@ -0,0 +1,107 @@
+"""
+Bandeja de salida de correos.
+
+Mandar un correo por SMTP dentro del request deja al worker de gunicorn esperando
+hasta EMAIL_TIMEOUT segundos. En su lugar encolar() guarda el mensaje en
+CorreoPendiente y `manage.py enviar_correos` (proceso aparte, ver Procfile) los
+manda de a lotes por una sola conexión, reintentando los que fallan con espera
+creciente hasta MAX_INTENTOS. Usa EMAIL_BACKEND, así que con el backend locmem o
+filebased de Django se puede probar sin servidor de correo.
+"""
+import logging
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import CorreoPendiente
+
+LOTE = 50
+MAX_INTENTOS = 5
+# un correo tomado por un worker no lo toma otro durante este tiempo (si el worker
+# muere a mitad del lote, el correo vuelve a la cola cuando vence)
+RESERVA = timedelta(minutes=5)
+DIAS_ENVIADOS = 30
+
+logger = logging.getLogger(__name__)
+
+
+def encolar(asunto, cuerpo, para, remitente=None, html=""):
+    return CorreoPendiente.objects.create(
+        asunto=asunto, cuerpo=cuerpo, html=html or "", remitente=remitente or "",
+        para=list(para), proximo_intento=timezone.now(),
+    )
+
+
+def _espera(intentos):
+    """1, 2, 4, 8... minutos después de cada fallo."""
+    return timedelta(minutes=2 ** (intentos - 1))
+
+
+def _reservar(lote, max_intentos, ahora):
+    """Toma hasta `lote` correos vencidos; el UPDATE condicionado evita que dos workers tomen el mismo."""
+    candidatos = CorreoPendiente.objects.filter(
+        enviado__isnull=True, intentos__lt=max_intentos, proximo_intento__lte=ahora,
+    ).order_by("proximo_intento", "id").values_list("id", "proximo_intento")[:lote]
+    tomados = [
+        pk for pk, previo in candidatos
+        if CorreoPendiente.objects.filter(pk=pk, proximo_intento=previo).update(proximo_intento=ahora + RESERVA)
+    ]
+    return list(CorreoPendiente.objects.filter(pk__in=tomados))
+
+
+def _mensaje(correo, conexion):
+    msg = EmailMultiAlternatives(
+        correo.asunto, correo.cuerpo, correo.remitente or None, correo.para, connection=conexion,
+    )
+    if correo.html:
+        msg.attach_alternative(correo.html, "text/html")
+    return msg
+
+
+def _fallo(correo, error, max_intentos):
+    correo.intentos += 1
+    correo.error = f"{type(error).__name__}: {error}"
+    correo.proximo_intento = timezone.now() + _espera(correo.intentos)
+    correo.save(update_fields=["intentos", "error", "proximo_intento"])
+    if correo.intentos >= max_intentos:
+        logger.error("Correo %s descartado tras %s intentos: %s", correo.pk, correo.intentos, correo.error)
+    else:
+        logger.warning("Correo %s falló (intento %s): %s", correo.pk, correo.intentos, correo.error)
+
+
+def enviar_pendientes(lote=LOTE, max_intentos=MAX_INTENTOS):
+    """Manda un lote de la cola por una sola conexión. Devuelve (enviados, fallidos)."""
+    correos = _reservar(lote, max_intentos, timezone.now())
+    if not correos:
+        return 0, 0
+
+    enviados, fallidos = 0, 0
+    resueltos = set()
+    try:
+        with get_connection() as conexion:
+            for correo in correos:
+                try:
+                    _mensaje(correo, conexion).send()
+                except Exception as e:
+                    _fallo(correo, e, max_intentos)
+                    fallidos += 1
+                else:
+                    # uno por uno: si el proceso muere a mitad, lo ya mandado no se repite
+                    correo.enviado = timezone.now()
+                    correo.error = ""
+                    correo.save(update_fields=["enviado", "error"])
+                    enviados += 1
+                resueltos.add(correo.pk)
+    except Exception as e:  # no se pudo abrir (o cerrar) la conexión
+        for correo in correos:
+            if correo.pk not in resueltos:
+                _fallo(correo, e, max_intentos)
+                fallidos += 1
+    return enviados, fallidos
+
+
+def borrar_enviados(dias=DIAS_ENVIADOS):
+    """Limpia de la tabla los correos ya enviados hace más de `dias` días."""
+    limite = timezone.now() - timedelta(days=dias)
+    return CorreoPendiente.objects.filter(enviado__lt=limite).delete()[0]
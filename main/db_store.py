@@ -0,0 +1,623 @@
+# main/db_store.py
+"""
+Backend de base de datos para los helpers de main/utils.py.
+
+Se activa con FERIAS_BACKEND = "db" en settings: utils toma de este módulo (en vez
+de json_store) las funciones de su API, así las vistas siguen usando la misma
+(add_feria, add_artesano, aprobar_solicitud, ...) pero sobre tablas indexadas.
+No hay documento que guardar entero: cada helper escribe solo las filas que cambian.
+"""
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone as dj_timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Feria, TipoProducto, ArtesanoFeria, SolicitudFeria, VersionFerias
+
+
+# -------------------- Documento (compatibilidad con el formato JSON) --------------------
+
+def _resumen(feria):
+    """Resumen guardado en las filas (Feria.ocupados y TipoProducto.ocupados), como en el JSON."""
+    tipos = [{"tipo": tp.tipo, "cupos": tp.cupos, "ocupados": tp.ocupados} for tp in feria.tipos_productos.all()]
+    return {"ocupados": feria.ocupados, "total_cupos": sum(tp["cupos"] for tp in tipos), "tipos": tipos}
+
+
+def _feria_dict(feria):
+    resumen = _resumen(feria)
+    tipos = [{"tipo": tp["tipo"], "cupos": tp["cupos"]} for tp in resumen["tipos"]]
+    return {
+        "id": feria.id,
+        "nombre": feria.nombre,
+        "fecha_inicio": feria.fecha_inicio.isoformat() if feria.fecha_inicio else "",
+        "fecha_fin": feria.fecha_fin.isoformat() if feria.fecha_fin else "",
+        "preferencias": feria.preferencias,
+        "ocupados": feria.ocupados,
+        "tipos_productos": tipos,
+        "cupos_totales": resumen["total_cupos"],
+        "resumen": resumen,
+    }
+
+
+def _artesano_dict(a):
+    return {
+        "id": a.id,
+        "nombre": a.nombre,
+        "tipo": a.tipo,
+        "descripcion": a.descripcion,
+        "feria_id": a.feria_id,
+    }
+
+
+def _solicitud_dict(s):
+    out = {
+        "id": s.id,
+        "usuario": s.usuario,
+        "nombre": s.nombre,
+        "descripcion": s.descripcion,
+        "feria_id": s.feria_id,
+        "tipo": s.tipo,
+        "estado": s.estado,
+        "creado": s.created_at.isoformat(timespec="seconds") if s.created_at else "",
+    }
+    if s.user_id:
+        out["user_id"] = s.user_id
+    return out
+
+
+def ferias():
+    """Ferias con tipos y resumen (2 consultas); las vistas usan esto y no el documento entero."""
+    return [_feria_dict(f) for f in Feria.objects.order_by("id").prefetch_related("tipos_productos")]
+
+
+def artesanos():
+    return [_artesano_dict(a) for a in ArtesanoFeria.objects.order_by("id")]
+
+
+def get_data():
+    """
+    Arma el documento {"ferias", "artesanos", "solicitudes"} desde la base de datos.
+    Lee TODAS las tablas: solo para comandos (migrar_ferias_db, archivar_ferias).
+    """
+    return {
+        "ferias": ferias(),
+        "artesanos": artesanos(),
+        "solicitudes": [_solicitud_dict(s) for s in SolicitudFeria.objects.order_by("id")],
+    }
+
+
+# Versión de ferias/artesanos: una fila en la base (VersionFerias), no el cache,
+# que con locmem es distinto en cada worker. Se sube dentro de la misma transacción
+# que la escritura, así nadie ve datos nuevos con la versión vieja.
+
+def _cambio():
+    """Marca que cambiaron ferias/artesanos (llamar dentro del atomic() de la escritura)."""
+    ahora = dj_timezone.now()
+    if not VersionFerias.objects.filter(pk=1).update(version=F("version") + 1, modificado=ahora):
+        VersionFerias.objects.get_or_create(pk=1, defaults={"version": 1, "modificado": ahora})
+
+
+def version_datos():
+    """(versión, última modificación) para claves de cache y ETag/Last-Modified; una consulta."""
+    fila = VersionFerias.objects.filter(pk=1).values_list("version", "modificado").first()
+    if fila is None:
+        return "0", datetime(2000, 1, 1, tzinfo=timezone.utc)
+    return str(fila[0]), fila[1]
+
+
+def invalidate_cache():
+    """No hay cache de documento en este backend; solo sube la versión (páginas y choices cacheados)."""
+    _cambio()
+
+
+def ocupacion():
+    """Índice de ocupación armado con un solo GROUP BY (feria_id, tipo)."""
+    from .utils import Ocupacion
+
+    oc = Ocupacion()
+    for feria_id, tipo, n in ArtesanoFeria.objects.values_list("feria_id", "tipo").annotate(n=Count("id")).order_by():
+        oc.agregar({"feria_id": feria_id, "tipo": tipo}, n)
+    return oc
+
+
+def buscar(coleccion, registro_id):
+    """Registro por id (o None), con el mismo formato que en el documento."""
+    try:
+        registro_id = int(registro_id)
+    except (TypeError, ValueError):
+        return None
+    if coleccion == "ferias":
+        obj = Feria.objects.prefetch_related("tipos_productos").filter(pk=registro_id).first()
+        return _feria_dict(obj) if obj else None
+    modelo, a_dict = {
+        "artesanos": (ArtesanoFeria, _artesano_dict),
+        "solicitudes": (SolicitudFeria, _solicitud_dict),
+    }[coleccion]
+    obj = modelo.objects.filter(pk=registro_id).first()
+    return a_dict(obj) if obj else None
+
+
+def _fecha(valor):
+    return valor or "2000-01-01"
+
+
+def importar_documento(data):
+    """
+    Copia un documento con el formato de ferias.json a las tablas (ver migrar_ferias_db).
+    Las ferias se emparejan por nombre con las filas que ya existan (así se
+    conservan los favoritos); los feria_id de artesanos y solicitudes se
+    traducen a los nuevos ids. Devuelve {id_json: id_db}.
+    """
+    User = get_user_model()
+    existentes = {f.nombre: f for f in Feria.objects.all()}
+    mapa = {}
+
+    for f in data.get("ferias", []):
+        nombre = (f.get("nombre") or f"Feria {f.get('id')}").strip()
+        obj = existentes.get(nombre) or Feria(nombre=nombre)
+        obj.fecha_inicio = _fecha(f.get("fecha_inicio"))
+        obj.fecha_fin = _fecha(f.get("fecha_fin"))
+        obj.preferencias = f.get("preferencias", "") or ""
+        obj.ocupados = 0
+        obj.save()
+        existentes[nombre] = obj
+        mapa[int(f["id"])] = obj.id
+
+        TipoProducto.objects.filter(feria_id=obj.id).delete()
+        TipoProducto.objects.bulk_create([
+            TipoProducto(feria_id=obj.id, tipo=(tp.get("tipo") or "").strip(), cupos=int(tp.get("cupos") or 0))
+            for tp in f.get("tipos_productos", []) or []
+        ])
+
+    ArtesanoFeria.objects.filter(feria_id__in=mapa.values()).delete()
+    ArtesanoFeria.objects.bulk_create([
+        ArtesanoFeria(
+            feria_id=mapa[int(a["feria_id"])],
+            nombre=a.get("nombre", ""),
+            tipo=a.get("tipo") or "",
+            descripcion=a.get("descripcion", ""),
+        )
+        for a in data.get("artesanos", [])
+        if int(a.get("feria_id", -1)) in mapa
+    ])
+    for fid in mapa.values():
+        Feria.objects.filter(pk=fid).update(ocupados=ArtesanoFeria.objects.filter(feria_id=fid).count())
+
+    usuarios = dict(User.objects.values_list("username", "id"))
+    ids_validos = set(usuarios.values())
+    SolicitudFeria.objects.filter(feria_id__in=mapa.values()).delete()
+    importadas = [
+        (SolicitudFeria(
+            user_id=s.get("user_id") if s.get("user_id") in ids_validos else usuarios.get(s.get("usuario")),
+            usuario=s.get("usuario", "") or "",
+            nombre=s.get("nombre", ""),
+            descripcion=s.get("descripcion", ""),
+            feria_id=mapa[int(s["feria_id"])],
+            tipo=s.get("tipo") or "",
+            estado=s.get("estado", "pendiente"),
+        ), parse_datetime(s.get("creado") or ""))
+        for s in data.get("solicitudes", [])
+        if int(s.get("feria_id", -1)) in mapa
+    ]
+    SolicitudFeria.objects.bulk_create([obj for obj, _ in importadas])
+    # created_at es auto_now_add (bulk_create le pone "ahora"): se copia "creado" después,
+    # así moderar_solicitudes sigue atendiendo primero a las más viejas
+    con_fecha = []
+    for obj, creado in importadas:
+        if creado is not None:
+            obj.created_at = creado
+            con_fecha.append(obj)
+    SolicitudFeria.objects.bulk_update(con_fecha, ["created_at"], batch_size=500)
+    return mapa
+
+
+
+def _set_tipos(feria, tipos):
+    TipoProducto.objects.filter(feria=feria).delete()
+    TipoProducto.objects.bulk_create([
+        TipoProducto(feria=feria, tipo=(tp.get("tipo") or "").strip(), cupos=int(tp.get("cupos") or 0))
+        for tp in tipos or []
+    ])
+
+
+def _conteos(ferias):
+    """Artesanos por feria_id y por (feria_id, tipo), con un solo GROUP BY."""
+    por_feria, por_tipo = {}, {}
+    filas = ArtesanoFeria.objects.filter(feria__in=ferias).values_list("feria_id", "tipo").annotate(n=Count("id"))
+    for feria_id, tipo, n in filas.order_by():
+        por_feria[feria_id] = por_feria.get(feria_id, 0) + n
+        por_tipo[(feria_id, tipo)] = n
+    return por_feria, por_tipo
+
+
+def _recalcular_ocupados(feria_ids=None):
+    """Pone al día Feria.ocupados y TipoProducto.ocupados (solo escribe las filas que cambian)."""
+    ferias = Feria.objects.all() if feria_ids is None else Feria.objects.filter(pk__in=feria_ids)
+    por_feria, por_tipo = _conteos(ferias)
+    for feria in ferias.only("id", "ocupados"):
+        n = por_feria.get(feria.id, 0)
+        if feria.ocupados != n:
+            Feria.objects.filter(pk=feria.id).update(ocupados=n)
+    cambiados = []
+    for tp in TipoProducto.objects.filter(feria__in=ferias).only("id", "feria_id", "tipo", "ocupados"):
+        n = por_tipo.get((tp.feria_id, tp.tipo), 0)
+        if tp.ocupados != n:
+            tp.ocupados = n
+            cambiados.append(tp)
+    TipoProducto.objects.bulk_update(cambiados, ["ocupados"])
+
+
+def reconstruir_resumenes(verificar=False):
+    """
+    Compara los ocupados guardados en las filas con un conteo desde cero.
+    Devuelve [(feria_id, guardado, calculado)] de los que no coincidían y,
+    salvo con verificar=True, los corrige.
+    """
+    por_feria, por_tipo = _conteos(Feria.objects.all())
+    diferencias = []
+    for feria in Feria.objects.order_by("id").prefetch_related("tipos_productos"):
+        guardado = _resumen(feria)
+        calculado = {
+            "ocupados": por_feria.get(feria.id, 0),
+            "total_cupos": guardado["total_cupos"],
+            "tipos": [dict(tp, ocupados=por_tipo.get((feria.id, tp["tipo"]), 0)) for tp in guardado["tipos"]],
+        }
+        if guardado != calculado:
+            diferencias.append((feria.id, guardado, calculado))
+    if diferencias and not verificar:
+        with db_transaction.atomic():
+            _cambio()
+            _recalcular_ocupados([fid for fid, _, _ in diferencias])
+    return diferencias
+
+
+# -------------------- Ferias --------------------
+
+def add_feria(feria):
+    feria["nombre"] = (feria.get("nombre") or "").strip()
+    with db_transaction.atomic():
+        _cambio()
+        obj = Feria.objects.create(
+            nombre=feria["nombre"],
+            fecha_inicio=_fecha(feria.get("fecha_inicio")),
+            fecha_fin=_fecha(feria.get("fecha_fin")),
+            preferencias=feria.get("preferencias", "") or "",
+            ocupados=0,
+        )
+        _set_tipos(obj, feria.get("tipos_productos", []))
+    feria["id"] = obj.id
+    feria["resumen"] = _resumen(obj)
+    feria["tipos_productos"] = [{"tipo": tp.tipo, "cupos": tp.cupos} for tp in obj.tipos_productos.all()]
+    feria["cupos_totales"] = sum(tp["cupos"] for tp in feria["tipos_productos"])
+    feria["ocupados"] = 0
+
+
+def delete_feria(feria_id):
+    feria_id = int(feria_id)
+    with db_transaction.atomic():
+        _cambio()
+        # artesanos y tipos se van por CASCADE; las solicitudes guardan el id suelto
+        SolicitudFeria.objects.filter(feria_id=feria_id).delete()
+        Feria.objects.filter(pk=feria_id).delete()
+
+
+def edit_feria(feria_id, new_data):
+    new_data = new_data or {}
+    with db_transaction.atomic():
+        feria = Feria.objects.select_for_update().filter(pk=int(feria_id)).first()
+        if not feria:
+            return
+        _cambio()
+        for campo in ("nombre", "fecha_inicio", "fecha_fin", "preferencias"):
+            if campo in new_data:
+                valor = new_data[campo]
+                if campo.startswith("fecha_"):
+                    valor = _fecha(valor)
+                setattr(feria, campo, valor if valor is not None else "")
+        feria.save()
+        if "tipos_productos" in new_data:
+            _set_tipos(feria, new_data["tipos_productos"])
+            _recalcular_ocupados([feria.id])
+
+
+def archivar(hoy=None, dias=None, simular=False):
+    """Igual que utils.archivar: lo archivado se borra de las tablas (artesanos y tipos por CASCADE)."""
+    from . import archivo
+
+    dias = archivo.DIAS_SOLICITUDES if dias is None else dias
+    with db_transaction.atomic():
+        lotes = archivo.seleccionar(get_data(), hoy, dias)
+        if lotes and not simular:
+            archivo.guardar(lotes)
+            quitar = archivo.ids(lotes)
+            _cambio()
+            SolicitudFeria.objects.filter(pk__in=quitar["solicitudes"]).delete()
+            Feria.objects.filter(pk__in=quitar["ferias"]).delete()
+    return archivo.conteo(lotes)
+
+
+# -------------------- Filas Feria (favoritos) --------------------
+
+# Aquí las ferias ya son filas: el id del documento es la pk
+FERIA_ID_FIELD = "id"
+
+
+def sync_ferias_db(ferias=None):
+    """No hace falta sincronizar: las ferias viven en la tabla Feria."""
+    return 0, 0
+
+
+# -------------------- Artesanos (aprobados) --------------------
+
+def _cupos_disponibles_para_tipo(feria, tipo):
+    """Devuelve (ocupados_tipo, cupos_tipo) para la feria y tipo dados."""
+    feria_id = int(feria["id"] if isinstance(feria, dict) else feria.id)
+    tp = TipoProducto.objects.filter(feria_id=feria_id, tipo=tipo).first()
+    cupos_tipo = tp.cupos if tp else 0
+    ocupados_tipo = ArtesanoFeria.objects.filter(feria_id=feria_id, tipo=tipo).count()
+    return ocupados_tipo, cupos_tipo
+
+
+def add_artesano(artesano):
+    """
+    Se usa al APROBAR una solicitud.
+    Valida cupos por tipo según la feria (no un tope fijo).
+    """
+    with db_transaction.atomic():
+        # bloquea la fila de la feria: dos aprobaciones simultáneas no pasan el mismo cupo
+        feria = Feria.objects.select_for_update().filter(pk=int(artesano["feria_id"])).first()
+        if not feria:
+            raise ValueError("Feria no encontrada")
+
+        tipo = artesano.get("tipo")
+        if not TipoProducto.objects.filter(feria=feria, tipo=tipo).exists():
+            raise ValueError("Tipo no disponible en esta feria")
+
+        ocupados_tipo, cupos_tipo = _cupos_disponibles_para_tipo(feria, tipo)
+        if cupos_tipo == 0 or ocupados_tipo >= cupos_tipo:
+            raise ValueError("¡Máximo de artesanos alcanzado para esta categoría!")
+
+        _cambio()
+        nuevo = ArtesanoFeria.objects.create(
+            feria=feria,
+            nombre=artesano.get("nombre", "").strip(),
+            tipo=tipo,
+            descripcion=artesano.get("descripcion", "").strip(),
+        )
+        _recalcular_ocupados([feria.id])
+    return _artesano_dict(nuevo)
+
+
+def delete_artesano(artesano_id):
+    with db_transaction.atomic():
+        a = ArtesanoFeria.objects.filter(pk=int(artesano_id)).first()
+        if a:
+            _cambio()
+            a.delete()
+            _recalcular_ocupados([a.feria_id])
+
+
+def edit_artesano(artesano_id, new_data):
+    new_data = new_data or {}
+    with db_transaction.atomic():
+        a = ArtesanoFeria.objects.filter(pk=int(artesano_id)).first()
+        if not a:
+            return
+        _cambio()
+        feria_anterior = a.feria_id
+        for campo in ("nombre", "tipo", "descripcion", "feria_id"):
+            if campo in new_data:
+                setattr(a, campo, int(new_data[campo]) if campo == "feria_id" else new_data[campo])
+        a.save()
+        _recalcular_ocupados({feria_anterior, a.feria_id})
+
+
+# -------------------- Solicitudes --------------------
+
+def add_solicitud(solicitud):
+    """Crea una solicitud con estado='pendiente' (misma estructura que en el JSON)."""
+    usuario = solicitud.get("usuario", "")
+    user_id = solicitud.get("user_id") or (
+        get_user_model().objects.filter(username=usuario).values_list("id", flat=True).first()
+    )
+    s = SolicitudFeria.objects.create(
+        user_id=user_id,
+        usuario=usuario,
+        nombre=solicitud.get("nombre", "").strip(),
+        descripcion=solicitud.get("descripcion", "").strip(),
+        feria_id=int(solicitud.get("feria_id")),
+        tipo=solicitud.get("tipo"),
+        estado="pendiente",
+    )
+    return _solicitud_dict(s)
+
+
+def _filtro_usuario(usuario, user_id):
+    """Por user_id; por username solo las solicitudes viejas que no lo tienen (igual que en el JSON)."""
+    filtro = Q(usuario=usuario, user_id__isnull=True) if usuario else Q(pk__in=[])
+    if user_id:
+        filtro |= Q(user_id=user_id)
+    return filtro
+
+
+def solicitudes_de(usuario="", user_id=None):
+    """Solicitudes de un usuario, de la más vieja a la más nueva."""
+    filtro = _filtro_usuario(usuario, user_id)
+    return [_solicitud_dict(s) for s in SolicitudFeria.objects.filter(filtro).order_by("id")]
+
+
+def set_estado_solicitud(solicitud_id, estado):
+    SolicitudFeria.objects.filter(pk=int(solicitud_id)).update(estado=estado)
+
+
+def aprobar_solicitud(solicitud_id):
+    """Aprueba (valida cupos y agrega a artesanos); setea estado='aceptado'."""
+    with db_transaction.atomic():
+        s = SolicitudFeria.objects.select_for_update().filter(pk=int(solicitud_id)).first()
+        if not s:
+            raise ValueError("Solicitud no encontrada")
+
+        if s.estado == "aceptado":
+            return  # ya estaba aceptada
+
+        add_artesano({
+            "nombre": s.nombre,
+            "tipo": s.tipo,
+            "descripcion": s.descripcion,
+            "feria_id": s.feria_id,
+        })
+        s.estado = "aceptado"
+        s.save(update_fields=["estado"])
+
+
+def aprobar_solicitudes(solicitud_ids):
+    """Aprueba varias solicitudes en una sola transacción (ver moderar_solicitudes)."""
+    return moderar_solicitudes(solicitud_ids, "aprobar")
+
+
+def moderar_solicitudes(solicitud_ids, accion):
+    """
+    Aprueba o rechaza un lote en una sola transacción (un savepoint por ítem),
+    en orden (feria, tipo, antigüedad). Devuelve [{"id", "ok", "mensaje"}].
+    """
+    if accion not in ("aprobar", "rechazar"):
+        raise ValueError("Acción no válida")
+
+    ids = list(dict.fromkeys(int(x) for x in solicitud_ids))
+    resultados = []
+    with db_transaction.atomic():
+        solicitudes = list(
+            SolicitudFeria.objects.select_for_update().filter(pk__in=ids)
+            .order_by("feria_id", "tipo", "created_at", "id")
+        )
+        encontradas = {s.pk for s in solicitudes}
+        resultados.extend(
+            {"id": sid, "ok": False, "mensaje": "Solicitud no encontrada"} for sid in ids if sid not in encontradas
+        )
+
+        for s in solicitudes:
+            if s.estado == "aceptado":
+                resultados.append({"id": s.pk, "ok": accion == "aprobar", "mensaje": "Ya estaba aceptada"})
+                continue
+            if accion == "rechazar":
+                s.estado = "rechazado"
+                s.save(update_fields=["estado"])
+                resultados.append({"id": s.pk, "ok": True, "mensaje": "Rechazada"})
+                continue
+            try:
+                with db_transaction.atomic():
+                    aprobar_solicitud(s.pk)
+            except ValueError as e:
+                resultados.append({"id": s.pk, "ok": False, "mensaje": str(e)})
+                continue
+            resultados.append({"id": s.pk, "ok": True, "mensaje": "Aprobada"})
+    return resultados
+
+
+def rechazar_solicitud(solicitud_id):
+    set_estado_solicitud(solicitud_id, "rechazado")
+
+
+def delete_solicitudes_usuario(user_id, username):
+    """Borra las solicitudes de un usuario (por user_id o por username). Devuelve cuántas."""
+    borradas, _ = SolicitudFeria.objects.filter(_filtro_usuario(username, user_id)).delete()
+    return borradas
+
+
+# -------------------- Utilidades para vistas --------------------
+
+def ferias_tipos_map():
+    mapa = {}
+    for feria_id, tipo in TipoProducto.objects.values_list("feria_id", "tipo"):
+        mapa.setdefault(str(feria_id), []).append(tipo)
+    for feria_id in Feria.objects.values_list("id", flat=True):
+        mapa.setdefault(str(feria_id), [])
+    return mapa
+
+
+# campos de orden permitidos (parámetro -> columna); "-campo" = descendente
+ORDEN_ARTESANOS = {"id": "id", "nombre": "nombre", "tipo": "tipo", "feria": "feria_id"}
+ORDEN_SOLICITUDES = {
+    "id": "id", "nombre": "nombre", "tipo": "tipo", "estado": "estado", "usuario": "usuario", "feria": "feria_id",
+}
+
+
+def _orden(orden, permitidos, defecto):
+    orden = orden or defecto
+    campo = permitidos.get(orden.lstrip("-"))
+    if campo is None:
+        return _orden(defecto, permitidos, defecto)
+    return ("-" if orden.startswith("-") else "") + campo
+
+
+def listar_artesanos(q="", feria_id=None, tipo="", orden=""):
+    """QuerySet (dicts) filtrado y ordenado; el Paginator solo trae la página pedida."""
+    qs = ArtesanoFeria.objects.all()
+    if q and q.strip():
+        qs = qs.filter(nombre__icontains=q.strip())
+    if str(feria_id or "").isdigit():
+        qs = qs.filter(feria_id=int(feria_id))
+    if tipo:
+        qs = qs.filter(tipo=tipo)
+    return qs.order_by(_orden(orden, ORDEN_ARTESANOS, "nombre")).values(
+        "id", "nombre", "tipo", "descripcion", "feria_id"
+    )
+
+
+def listar_solicitudes(estado="", feria_id=None, tipo="", usuario="", orden=""):
+    qs = SolicitudFeria.objects.all()
+    if estado:
+        qs = qs.filter(estado=estado)
+    if str(feria_id or "").isdigit():
+        qs = qs.filter(feria_id=int(feria_id))
+    if tipo:
+        qs = qs.filter(tipo=tipo)
+    if usuario:
+        qs = qs.filter(usuario=usuario)
+    return qs.order_by(_orden(orden, ORDEN_SOLICITUDES, "-id")).values(
+        "id", "usuario", "nombre", "descripcion", "feria_id", "tipo", "estado", "created_at"
+    )
+
+
+# -------------------- Búsqueda (FTS5) --------------------
+
+# rowid de main_busqueda = id * 4 + clase (ver migración 0011_busqueda_fts)
+_CLASES_FTS = {0: "feria", 1: "artesano", 2: "producto"}
+
+
+_fts = {}
+
+
+def _hay_fts():
+    """¿Existe main_busqueda? (se consulta una vez por alias de conexión)."""
+    if connection.alias not in _fts:
+        _fts[connection.alias] = (
+            connection.vendor == "sqlite" and "main_busqueda" in connection.introspection.table_names()
+        )
+    return _fts[connection.alias]
+
+
+def buscar_texto(consulta, limite=500):
+    """
+    [(clase, id, puntaje)] por relevancia usando la tabla FTS5 (la mantienen
+    triggers, así que siempre está al día). Sin FTS5 se usa el índice en memoria.
+    """
+    from . import busqueda
+
+    if not _hay_fts():
+        return busqueda.buscar_texto(consulta, limite)
+    tokens = busqueda.tokenizar(consulta)
+    if not tokens:
+        return []
+    # cada token como prefijo; todos deben aparecer
+    match = " ".join(f'"{t}"*' for t in dict.fromkeys(tokens))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, bm25(main_busqueda, 3.0, 2.0, 1.0) AS r FROM main_busqueda "
+            "WHERE main_busqueda MATCH %s ORDER BY r, rowid LIMIT %s",
+            [match, limite],
+        )
+        return [(_CLASES_FTS[rowid % 4], rowid // 4, -r) for rowid, r in cursor.fetchall()]
@@ -4,7 +4,9 @@ from .models import CustomUser
 from django.forms import formset_factory
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import PasswordResetForm
+from django.template import loader
 from django.utils.translation import gettext_lazy as _
+from . import correos
 from .models import Artesano, Producto
 from django.forms import inlineformset_factory
 
@@ -117,6 +119,15 @@ class TipoProductoForm(forms.Form):
 TipoProductoFormSet = formset_factory(TipoProductoForm, extra=1)
 
 
+def _tipos_de_feria(form, opciones):
+    """Choices de tipo para la feria ya elegida en el form (lookup directo en opciones["tipos"])."""
+    feria_id = form.data.get("feria_id") or form.initial.get("feria_id")
+    try:
+        return list(opciones["tipos"].get(int(feria_id), []))
+    except (TypeError, ValueError):
+        return []
+
+
 # ============ (LEGADO) Form de Artesano para admin ============
 # Lo dejamos por compatibilidad con tu panel actual, aunque ya no se usa para crear.
 class ArtesanoForm(forms.Form):
@@ -133,36 +144,11 @@ class ArtesanoForm(forms.Form):
         super().__init__(*args, **kwargs)
 
         from . import utils
-        data = utils.load_data()
-        ferias = data.get("ferias", [])
+        opciones = utils.opciones_ferias()
 
         # Ferias con cupos
-        ferias_disponibles = []
-        for f in ferias:
-            total_cupos = sum(tp["cupos"] for tp in f.get("tipos_productos", []))
-            ocupados = f.get("ocupados", 0)
-            if ocupados < total_cupos:
-                ferias_disponibles.append(
-                    (f["id"], f"{f.get('nombre', f'Feria {f['id']}')} - {f.get('fecha_inicio','')} al {f.get('fecha_fin','')}")
-                )
-
-        if not ferias_disponibles:
-            ferias_disponibles = [("", "⚠ No hay ferias disponibles")]
-
-        self.fields["feria_id"].choices = ferias_disponibles
-
-        # Cargar tipos según feria elegida
-        feria_id = self.data.get("feria_id") or self.initial.get("feria_id")
-        if feria_id:
-            try:
-                feria_id = int(feria_id)
-                feria = next(f for f in ferias if f["id"] == feria_id)
-                tipos = [(tp["tipo"], tp["tipo"]) for tp in feria.get("tipos_productos", [])]
-                self.fields["tipo"].choices = tipos
-            except Exception:
-                self.fields["tipo"].choices = []
-        else:
-            self.fields["tipo"].choices = []
+        self.fields["feria_id"].choices = list(opciones["disponibles"]) or [("", "⚠ No hay ferias disponibles")]
+        self.fields["tipo"].choices = _tipos_de_feria(self, opciones)
 
 
 # ============ Nuevo: Formulario de Solicitud para Artesano ============
@@ -177,27 +163,13 @@ class SolicitudFeriaForm(forms.Form):
         super().__init__(*args, **kwargs)
 
         from . import utils
-        data = utils.load_data()
-        ferias = data.get("ferias", [])
+        opciones = utils.opciones_ferias()
 
         # opciones de ferias
-        self.fields["feria_id"].choices = [
-            (f["id"], f.get("nombre", f"Feria {f['id']}"))
-            for f in ferias
-        ] or [("", "⚠ No hay ferias")]
+        self.fields["feria_id"].choices = list(opciones["ferias"]) or [("", "⚠ No hay ferias")]
 
         # cargar tipos si ya hay feria seleccionada
-        feria_id = self.data.get("feria_id") or self.initial.get("feria_id")
-        if feria_id:
-            try:
-                feria_id = int(feria_id)
-                feria = next(f for f in ferias if f["id"] == feria_id)
-                tipos = [(tp["tipo"], tp["tipo"]) for tp in feria.get("tipos_productos", [])]
-                self.fields["tipo"].choices = tipos
-            except Exception:
-                self.fields["tipo"].choices = []
-        else:
-            self.fields["tipo"].choices = []
+        self.fields["tipo"].choices = _tipos_de_feria(self, opciones)
 
 
 User = get_user_model()
@@ -235,6 +207,14 @@ class CustomPasswordResetForm(PasswordResetForm):
         'numeric': _("La contraseña no puede contener solo números."),
     }
 
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email,
+                  html_email_template_name=None):
+        """Arma el mismo correo que Django pero lo encola (ver correos.py) en vez de mandarlo en el request."""
+        asunto = "".join(loader.render_to_string(subject_template_name, context).splitlines())
+        cuerpo = loader.render_to_string(email_template_name, context)
+        html = loader.render_to_string(html_email_template_name, context) if html_email_template_name else ""
+        correos.encolar(asunto, cuerpo, [to_email], remitente=from_email, html=html)
+
 class ArtesanoPerfilForm(forms.ModelForm):
     class Meta:
         model = Artesano
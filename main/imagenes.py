@@ -0,0 +1,110 @@
+"""
+Fotos de productos.
+
+Se procesan UNA vez, al subirlas: de cada foto se guardan variantes de ANCHOS px
+(sin agrandar) en JPEG y WebP, con nombre = hash del contenido + ancho:
+
+    productos/<hash>-<ancho>.jpg / .webp
+
+El nombre cambia si cambia la imagen, así que se pueden servir con cache larga
+(immutable), y la misma foto subida dos veces no se vuelve a procesar. Los
+templates arman srcset con Producto.imagen_srcset_* (ver templates/productos/_foto.html).
+
+Los formularios solo validan (validar); los archivos se escriben al guardar, y las
+variantes que ningún producto usa (foto reemplazada o producto borrado) se borran.
+"""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Producto
+
+ANCHOS = (320, 640, 1280)
+CARPETA = "productos"
+MAX_BYTES = 10 * 1024 * 1024
+FORMATOS = {"jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+            "webp": ("WEBP", {"quality": 80, "method": 4})}
+
+
+def nombre(base, ancho, ext):
+    return f"{base}-{ancho}.{ext}"
+
+
+def _rgb(img):
+    """JPEG no tiene transparencia: se aplana sobre blanco."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.getchannel("A"))
+        return fondo
+    return img.convert("RGB")
+
+
+def _abrir(archivo):
+    """(bytes, imagen RGB ya rotada); ValueError si pesa demasiado o no es una imagen."""
+    archivo.seek(0)
+    crudo = archivo.read()
+    archivo.seek(0)
+    if len(crudo) > MAX_BYTES:
+        raise ValueError(f"La imagen no puede pesar más de {MAX_BYTES // (1024 * 1024)} MB.")
+    try:
+        img = Image.open(io.BytesIO(crudo))
+        return crudo, _rgb(ImageOps.exif_transpose(img))
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValueError("El archivo no es una imagen válida.")
+
+
+def validar(archivo):
+    """Para los formularios: ValueError si la foto no sirve (no escribe nada)."""
+    _abrir(archivo)
+
+
+def procesar(archivo):
+    """
+    Genera y guarda las variantes de una foto subida.
+    Devuelve (base, anchos, alto del más grande); ValueError si no es una imagen.
+    """
+    crudo, img = _abrir(archivo)
+    base = f"{CARPETA}/{hashlib.sha256(crudo).hexdigest()[:20]}"
+
+    anchos = sorted({min(a, img.width) for a in ANCHOS})
+    for ancho in anchos:
+        variante = None
+        for ext, (formato, opciones) in FORMATOS.items():
+            destino = nombre(base, ancho, ext)
+            if default_storage.exists(destino):
+                continue  # la misma foto ya estaba procesada
+            if variante is None:
+                alto = max(1, round(img.height * ancho / img.width))
+                variante = img if ancho == img.width else img.resize((ancho, alto), Image.LANCZOS)
+            buf = io.BytesIO()
+            variante.save(buf, formato, **opciones)
+            default_storage.save(destino, ContentFile(buf.getvalue()))
+    return base, anchos, max(1, round(img.height * anchos[-1] / img.width))
+
+
+def borrar(fotos):
+    """Borra las variantes de [(base, anchos)] que ya no usa ningún producto (misma foto = mismo archivo)."""
+    fotos = [(base, anchos) for base, anchos in fotos if base]
+    if not fotos:
+        return
+    en_uso = set(Producto.objects.filter(imagen__in={b for b, _ in fotos}).values_list("imagen", flat=True))
+    for base, anchos in fotos:
+        if base in en_uso:
+            continue
+        for ancho in anchos:
+            for ext in FORMATOS:
+                default_storage.delete(nombre(base, ancho, ext))
+
+
+@receiver(post_delete, sender=Producto)
+def _producto_borrado(sender, instance, **kwargs):
+    if instance.imagen:
+        foto = (instance.imagen, list(instance.imagen_anchos))
+        transaction.on_commit(lambda: borrar([foto]))
@@ -0,0 +1,1152 @@
+# main/json_store.py
+"""
+Backend por defecto de main/utils.py: ferias, artesanos y solicitudes en un
+documento (ferias.json) más su diario append-only.
+
+utils usa este módulo o db_store según FERIAS_BACKEND. Los comandos que trabajan
+sobre el archivo (migrar_ferias_db, convertir_ferias, compactar_ferias) lo usan
+directamente, sea cual sea el backend activo.
+"""
+import json, os, tempfile, threading, uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.dateparse import parse_date
+from filelock import FileLock
+
+try:  # codec JSON más rápido, opcional
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # formato binario, opcional
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data/ferias.json")
+
+# "json" | "json-compacto" | "msgpack" (ver settings.FERIAS_FORMATO)
+FORMATOS = ("json", "json-compacto", "msgpack")
+FORMATO = getattr(settings, "FERIAS_FORMATO", "json")
+
+# Segundos que se espera por el lock de escritura antes de fallar (filelock.Timeout)
+LOCK_TIMEOUT = 30
+
+# Las altas/cambios de solicitudes y artesanos se agregan a un diario (JSON Lines)
+# en vez de reescribir ferias.json; pasado este tamaño se compacta en el snapshot.
+DIARIO_MAX_BYTES = 1024 * 1024
+
+# Cache del documento parseado (uno por proceso). Se recarga solo si cambia
+# la firma de los archivos (mtime/tamaño/inode) o la generación local; si solo
+# creció el diario se aplican las líneas nuevas sin volver a parsear el snapshot.
+_cache = {"firma": None, "data": None, "ocupacion": None, "indices": {}, "diario_pos": 0}
+_cache_lock = threading.Lock()
+_generation = 0
+
+# Estado por hilo: profundidad del lock de archivo y documento de la transacción en curso
+_local = threading.local()
+_thread_lock = threading.Lock()
+
+
+# -------------------- IO --------------------
+
+def _ensure_file():
+    """Crea el JSON si no existe, con llaves base."""
+    if not os.path.exists(DATA_FILE):
+        with _file_lock():
+            if not os.path.exists(DATA_FILE):
+                save_data({"ferias": [], "artesanos": [], "solicitudes": []})
+
+
+@contextmanager
+def _file_lock():
+    """
+    Lock exclusivo sobre ferias.json entre procesos (workers de gunicorn) y entre
+    hilos del mismo proceso. Es reentrante dentro del mismo hilo.
+    """
+    if getattr(_local, "lock_depth", 0):
+        _local.lock_depth += 1
+        try:
+            yield
+        finally:
+            _local.lock_depth -= 1
+        return
+
+    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
+    with _thread_lock, FileLock(DATA_FILE + ".lock", timeout=LOCK_TIMEOUT):
+        _local.lock_depth = 1
+        try:
+            yield
+        finally:
+            _local.lock_depth = 0
+
+
+def _archivo_diario():
+    return os.path.splitext(DATA_FILE)[0] + ".diario.jsonl"
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _firma_archivo():
+    st = os.stat(DATA_FILE)
+    sd = _stat(_archivo_diario())
+    diario = (sd.st_mtime_ns, sd.st_size, sd.st_ino) if sd else None
+    return ((st.st_mtime_ns, st.st_size, st.st_ino), diario, _generation)
+
+
+# -------------------- Formato del snapshot --------------------
+
+def _json_loads(crudo):
+    return orjson.loads(crudo) if orjson is not None else json.loads(crudo)
+
+
+def detectar_formato(crudo):
+    """"json" o "msgpack" según el primer byte (un documento msgpack empieza con un map)."""
+    inicio = crudo.lstrip()[:1]
+    if inicio == b"{" or not inicio:
+        return "json"
+    if 0x80 <= inicio[0] <= 0x8F or inicio[0] in (0xDE, 0xDF):
+        return "msgpack"
+    raise ValueError("Formato de ferias.json no reconocido")
+
+
+def _decodificar(crudo):
+    """Documento desde los bytes del archivo, en cualquiera de los formatos soportados."""
+    if detectar_formato(crudo) == "msgpack":
+        if msgpack is None:
+            raise ImproperlyConfigured("ferias.json está en formato msgpack: instala el paquete msgpack")
+        return msgpack.unpackb(crudo, raw=False)
+    return _json_loads(crudo)
+
+
+def _codificar(data, formato=None):
+    formato = formato or FORMATO
+    if formato == "json":
+        return json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
+    if formato == "json-compacto":
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if formato == "msgpack":
+        if msgpack is None:
+            raise ImproperlyConfigured("FERIAS_FORMATO=msgpack requiere el paquete msgpack")
+        return msgpack.packb(data, use_bin_type=True)
+    raise ImproperlyConfigured(f"FERIAS_FORMATO no válido: {formato!r} (opciones: {', '.join(FORMATOS)})")
+
+
+def _leer_archivo():
+    """Snapshot + diario. Devuelve (documento, bytes del diario ya aplicados)."""
+    with open(DATA_FILE, "rb") as f:
+        data = _decodificar(f.read())
+    # llaves seguras
+    data.setdefault("ferias", [])
+    data.setdefault("artesanos", [])
+    data.setdefault("solicitudes", [])
+    lineas, pos = _leer_diario(data.get("diario"), 0)
+    _reproducir(data, lineas)
+    return data, pos
+
+
+# -------------------- Diario (append-only) --------------------
+# ferias.diario.jsonl: una cabecera {"base": <token del snapshot>} y una línea por
+# transacción {"ops": [{"col", "reg"} | {"col", "id"}], "secuencias": {...}} con el
+# estado final de cada registro tocado (o su borrado). Reproducirlo dos veces da lo
+# mismo; un diario con otra base (quedó de antes de una compactación) se ignora.
+
+def _leer_diario(base, pos):
+    """Líneas completas del diario desde el byte pos: (lineas, nueva posición)."""
+    try:
+        with open(_archivo_diario(), "rb") as f:
+            f.seek(pos)
+            crudo = f.read()
+    except FileNotFoundError:
+        return [], 0
+
+    lineas = []
+    for linea in crudo.split(b"\n")[:-1]:  # la última está incompleta (o vacía)
+        try:
+            registro = _json_loads(linea)
+        except ValueError:
+            break  # escritura cortada: lo que sigue no se aplica
+        if pos == 0:
+            # cabecera: el diario tiene que ser de este snapshot
+            if base is None or registro.get("base") != base:
+                return [], 0
+        else:
+            lineas.append(registro)
+        pos += len(linea) + 1
+    return lineas, pos
+
+
+def _reproducir(data, lineas):
+    """Aplica líneas del diario sobre el documento (reemplaza registros por id)."""
+    posiciones = {}
+    borrados = {}
+    for linea in lineas:
+        for op in linea.get("ops", []):
+            coleccion = op["col"]
+            lista = data.setdefault(coleccion, [])
+            indice = posiciones.get(coleccion)
+            if indice is None:
+                indice = posiciones[coleccion] = {int(x.get("id")): i for i, x in enumerate(lista)}
+            if "reg" in op:
+                rid = int(op["reg"]["id"])
+                i = indice.get(rid)
+                if i is None:
+                    indice[rid] = len(lista)
+                    lista.append(op["reg"])
+                else:
+                    lista[i] = op["reg"]
+                borrados.get(coleccion, set()).discard(rid)
+            else:
+                borrados.setdefault(coleccion, set()).add(int(op["id"]))
+        if "secuencias" in linea:
+            data["secuencias"] = linea["secuencias"]
+    for coleccion, ids in borrados.items():
+        if ids:
+            data[coleccion] = [x for x in data[coleccion] if int(x.get("id")) not in ids]
+
+
+def _anotar(coleccion, registro_id):
+    """Marca un registro como tocado en la transacción en curso (va al diario al confirmar)."""
+    diario = getattr(_local, "diario", None)
+    if diario is not None:
+        diario[(coleccion, int(registro_id))] = None
+
+
+def _escribir_diario(data, tocados):
+    """
+    Agrega una línea al diario con el estado final de los registros tocados.
+    Devuelve False si corresponde compactar (snapshot sin base o diario muy grande).
+    """
+    base = data.get("diario")
+    if base is None:
+        return False
+    ops = []
+    for coleccion, rid in tocados:
+        reg = por_id(coleccion).get(rid)
+        ops.append({"col": coleccion, "reg": reg} if reg is not None else {"col": coleccion, "id": rid})
+    linea = json.dumps({"ops": ops, "secuencias": data.get("secuencias", {})}, ensure_ascii=False,
+                       separators=(",", ":")).encode("utf-8") + b"\n"
+
+    path = _archivo_diario()
+    st = _stat(path)
+    if st is not None and st.st_size + len(linea) > DIARIO_MAX_BYTES:
+        return False
+    if st is not None:
+        with open(path, "rb") as f:
+            cabecera = f.readline()
+        try:
+            vigente = json.loads(cabecera).get("base") == base
+        except ValueError:
+            vigente = False
+    if st is None or not vigente:
+        cabecera = json.dumps({"base": base}).encode("utf-8") + b"\n"
+        _escribir_atomico(path, cabecera + linea)
+        return True
+    with open(path, "r+b") as f:
+        _quitar_linea_cortada(f)
+        f.write(linea)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+def _quitar_linea_cortada(f):
+    """
+    Deja el diario terminado en una línea completa (y el archivo posicionado al final).
+    Si una escritura anterior quedó a medias, el lector frena ahí: lo que se agregara
+    detrás se perdería al recargar, así que el pedazo se descarta antes de escribir.
+    """
+    fin = f.seek(0, os.SEEK_END)
+    if fin == 0:
+        return
+    f.seek(fin - 1)
+    if f.read(1) == b"\n":
+        return
+    f.seek(0)
+    corte = f.read().rfind(b"\n") + 1
+    f.truncate(corte)
+    f.seek(corte)
+
+
+def compactar():
+    """Vuelca el diario en ferias.json (reescritura completa) y lo borra. Devuelve los bytes compactados."""
+    _ensure_file()
+    st = _stat(_archivo_diario())
+    with transaction():
+        pass  # una transacción común siempre guarda el snapshot completo
+    return st.st_size if st else 0
+
+
+def version_datos():
+    """
+    (versión, última modificación) de ferias/artesanos, la misma en todos los procesos
+    (sale de la firma de ferias.json y su diario). Para claves de cache y ETag/Last-Modified.
+    """
+    _ensure_file()
+    st = os.stat(DATA_FILE)
+    version, mtime = f"{st.st_mtime_ns}-{st.st_size}-{st.st_ino}", st.st_mtime
+    sd = _stat(_archivo_diario())
+    if sd is not None:
+        version += f"-{sd.st_mtime_ns}-{sd.st_size}"
+        mtime = max(mtime, sd.st_mtime)
+    return version, datetime.fromtimestamp(mtime, tz=timezone.utc)
+
+
+def invalidate_cache():
+    """Descarta el documento cacheado; la próxima lectura vuelve a parsear el JSON."""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache["firma"] = None
+        _cache["data"] = None
+        _cache["ocupacion"] = None
+        _cache["indices"] = {}
+
+
+def get_data():
+    """
+    Documento compartido (cacheado) de SOLO LECTURA.
+    Úsalo en vistas/formularios que no modifican nada; para mutar usa transaction().
+    Dentro de una transacción devuelve el documento en curso.
+    """
+    en_curso = getattr(_local, "data", None)
+    if en_curso is not None:
+        return en_curso
+
+    _ensure_file()
+    with _cache_lock:
+        firma = _firma_archivo()
+        previa = _cache["firma"]
+        if previa != firma:
+            if _solo_crecio_diario(previa, firma):
+                # otro proceso agregó líneas al diario: se aplican sobre una copia
+                data = _copiar(_cache["data"])
+                lineas, pos = _leer_diario(data.get("diario"), _cache["diario_pos"])
+                _reproducir(data, lineas)
+            else:
+                data, pos = _leer_archivo()
+            _cache["data"] = data
+            _cache["diario_pos"] = pos
+            _cache["ocupacion"] = None
+            _cache["indices"] = {}
+            # releer la firma por si el archivo cambió mientras lo parseábamos
+            _cache["firma"] = firma if firma == _firma_archivo() else None
+        return _cache["data"]
+
+
+def _solo_crecio_diario(previa, firma):
+    if previa is None or previa[0] != firma[0] or previa[2] != firma[2]:
+        return False
+    antes, ahora = previa[1], firma[1]
+    return (antes is not None and ahora is not None and antes[2] == ahora[2]
+            and ahora[1] >= _cache["diario_pos"] > 0)
+
+
+def ferias():
+    """Ferias (con su resumen) de SOLO LECTURA; para las vistas que no necesitan el resto del documento."""
+    return get_data()["ferias"]
+
+
+def artesanos():
+    """Artesanos aprobados de SOLO LECTURA, en orden de alta."""
+    return get_data()["artesanos"]
+
+
+def load_data():
+    """Copia mutable del documento (copia completa, sin volver a parsear el JSON)."""
+    return _copiar(get_data())
+
+
+def _copiar(valor):
+    """
+    Copia profunda de un documento JSON (dicts, listas y escalares). Los registros
+    tienen listas y dicts adentro (tipos_productos, resumen): con una copia de un
+    solo nivel, lo que se mutara en una transacción que falla quedaba en el cache.
+    """
+    if isinstance(valor, dict):
+        return {k: _copiar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_copiar(v) for v in valor]
+    return valor
+
+
+def _escribir_atomico(path, contenido):
+    """Archivo temporal en la misma carpeta, fsync y rename: un lector nunca ve un archivo a medias."""
+    carpeta = os.path.dirname(path)
+    os.makedirs(carpeta, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=carpeta, prefix=".ferias-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp crea el archivo con 0600; conservar los permisos del original
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_data(data, formato=None):
+    """
+    Escritura atómica del documento completo sobre ferias.json (en FERIAS_FORMATO
+    o el formato indicado). Es también la compactación: el snapshot recibe una
+    base nueva y el diario anterior se borra (si quedara por un corte, su
+    cabecera ya no coincide y se ignora).
+    """
+    with _file_lock():
+        data["diario"] = uuid.uuid4().hex
+        _escribir_atomico(DATA_FILE, _codificar(data, formato))
+        try:
+            os.remove(_archivo_diario())
+        except FileNotFoundError:
+            pass
+    invalidate_cache()
+
+
+@contextmanager
+def transaction(diario=False):
+    """
+    Lectura-modificación-escritura con lock exclusivo:
+
+        with json_store.transaction() as data:
+            data["ferias"].append(...)
+
+    Al salir sin excepción guarda el documento de forma atómica; si hay una
+    excepción no se escribe nada. Las transacciones anidadas (p. ej. un helper
+    que llama a otro) comparten el mismo documento y solo guarda la externa.
+
+    Con diario=True (helpers de solicitudes y artesanos) solo se agrega al diario
+    lo que se marcó con _anotar(); basta un helper sin diario en la misma
+    transacción para que se guarde el snapshot completo.
+    """
+    en_curso = getattr(_local, "data", None)
+    if en_curso is not None:
+        if not diario:
+            _local.diario = None
+        yield en_curso
+        return
+
+    with _file_lock():
+        snapshot = get_data()
+        data = _copiar(snapshot)
+        with _cache_lock:
+            oc = _cache["ocupacion"] if _cache["data"] is snapshot else None
+        _local.data = data
+        _local.ocupacion = oc.copy() if oc is not None else None
+        _local.indices = {}
+        _local.diario = {} if diario else None
+        try:
+            yield data
+            tocados = _local.diario
+            if tocados == {}:
+                return  # no cambió nada
+            if tocados is None or not _escribir_diario(data, tocados):
+                save_data(data)
+            # el documento recién escrito queda como cache (con sus índices): no hace falta re-parsear
+            with _cache_lock:
+                _cache["firma"] = _firma_archivo()
+                _cache["data"] = data
+                _cache["diario_pos"] = (_cache["firma"][1] or (0, 0))[1]
+                _cache["ocupacion"] = _local.ocupacion
+                _cache["indices"] = _local.indices
+        finally:
+            _local.data = None
+            _local.ocupacion = None
+            _local.indices = None
+            _local.diario = None
+
+
+# -------------------- IDs e índices por id --------------------
+
+def _siguiente_id(data, coleccion):
+    """
+    Secuencia persistente por colección (data["secuencias"]), sin recorrer la lista.
+    La primera vez arranca desde el máximo existente; los ids borrados no se reutilizan.
+    """
+    secuencias = data.setdefault("secuencias", {})
+    if coleccion not in secuencias:
+        secuencias[coleccion] = max((int(x.get("id", 0)) for x in data[coleccion]), default=0)
+    secuencias[coleccion] += 1
+    return secuencias[coleccion]
+
+
+def _indices_actuales():
+    """(documento, índices) del documento actual: el de la transacción en curso o el cacheado."""
+    en_curso = getattr(_local, "data", None)
+    if en_curso is not None:
+        return en_curso, _local.indices
+    data = get_data()
+    with _cache_lock:
+        return data, (_cache["indices"] if _cache["data"] is data else {})
+
+
+def por_id(coleccion):
+    """
+    {id: registro} de "ferias", "artesanos" o "solicitudes" del documento actual.
+    Se arma una vez por documento (cacheado o de la transacción en curso) y los
+    helpers lo mantienen al agregar/borrar.
+    """
+    data, indices = _indices_actuales()
+    indice = indices.get(coleccion)
+    if indice is None:
+        indice = indices[coleccion] = {int(x.get("id")): x for x in data[coleccion]}
+    return indice
+
+
+def _claves_usuario(s):
+    # por user_id (no cambia si el usuario se renombra); por username solo las viejas que no lo tienen
+    if s.get("user_id"):
+        return [("user_id", int(s["user_id"]))]
+    return [("usuario", s.get("usuario") or "")]
+
+
+def _por_usuario():
+    """{("usuario", username) | ("user_id", id): [solicitudes en orden de llegada]}; se mantiene como por_id."""
+    data, indices = _indices_actuales()
+    indice = indices.get("solicitudes:usuario")
+    if indice is None:
+        indice = indices["solicitudes:usuario"] = {}
+        for s in data["solicitudes"]:
+            for clave in _claves_usuario(s):
+                indice.setdefault(clave, []).append(s)
+    return indice
+
+
+def solicitudes_de(usuario="", user_id=None):
+    """
+    Solicitudes de un usuario, de la más vieja a la más nueva, sin recorrer las demás:
+    las que tienen user_id por user_id; las viejas (sin user_id) por username.
+    """
+    indice = _por_usuario()
+    encontradas = {}
+    if usuario:
+        encontradas.update((int(s["id"]), s) for s in indice.get(("usuario", usuario), ()))
+    if user_id:
+        encontradas.update((int(s["id"]), s) for s in indice.get(("user_id", int(user_id)), ()))
+    return [encontradas[k] for k in sorted(encontradas)]
+
+
+def buscar(coleccion, registro_id):
+    """Registro por id (o None) en O(1)."""
+    try:
+        return por_id(coleccion).get(int(registro_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def _indexar(coleccion, registro):
+    indices = getattr(_local, "indices", None) or {}
+    indice = indices.get(coleccion)
+    if indice is not None:
+        indice[int(registro["id"])] = registro
+    if coleccion == "solicitudes" and "solicitudes:usuario" in indices:
+        for clave in _claves_usuario(registro):
+            indices["solicitudes:usuario"].setdefault(clave, []).append(registro)
+
+
+def _desindexar(coleccion, registro_id=None, registro=None):
+    """
+    Quita un id de los índices (pasando el registro no hace falta buscarlo);
+    sin id descarta los índices completos (se vuelven a armar si se piden).
+    """
+    indices = getattr(_local, "indices", None) or {}
+    if registro_id is None:
+        indices.pop(coleccion, None)
+        indices.pop(coleccion + ":usuario", None)
+        return
+    if coleccion in indices:
+        registro = indices[coleccion].pop(int(registro_id), None) or registro
+    por_usuario = indices.get(coleccion + ":usuario")
+    if por_usuario is not None:
+        if registro is None:
+            indices.pop(coleccion + ":usuario")  # no se sabe en qué listas estaba
+            return
+        for clave in _claves_usuario(registro):
+            lista = por_usuario.get(clave, [])
+            if registro in lista:
+                lista.remove(registro)
+
+
+# -------------------- Ocupación (índice de cupos) --------------------
+
+class Ocupacion:
+    """
+    Artesanos aprobados contados por feria_id y por (feria_id, tipo), en una sola pasada.
+    Se cachea junto al documento y los helpers de artesanos lo mantienen al día.
+    """
+
+    def __init__(self, artesanos=()):
+        self.por_feria = Counter()
+        self.por_tipo = Counter()
+        for a in artesanos:
+            self.agregar(a)
+
+    def agregar(self, artesano, n=1):
+        fid = int(artesano.get("feria_id"))
+        self.por_feria[fid] += n
+        self.por_tipo[(fid, artesano.get("tipo"))] += n
+
+    def quitar(self, artesano):
+        self.agregar(artesano, -1)
+
+    def copy(self):
+        nuevo = Ocupacion()
+        nuevo.por_feria = self.por_feria.copy()
+        nuevo.por_tipo = self.por_tipo.copy()
+        return nuevo
+
+    def feria(self, feria_id):
+        return self.por_feria[int(feria_id)]
+
+    def tipo(self, feria_id, tipo):
+        return self.por_tipo[(int(feria_id), tipo)]
+
+
+def ocupacion():
+    """Índice de ocupación del documento actual (el de la transacción en curso, si la hay)."""
+    en_curso = getattr(_local, "data", None)
+    if en_curso is not None:
+        if _local.ocupacion is None:
+            _local.ocupacion = Ocupacion(en_curso["artesanos"])
+        return _local.ocupacion
+
+    data = get_data()
+    with _cache_lock:
+        if _cache["data"] is data:
+            if _cache["ocupacion"] is None:
+                _cache["ocupacion"] = Ocupacion(data["artesanos"])
+            return _cache["ocupacion"]
+    # el cache cambió mientras tanto: índice solo para este documento
+    return Ocupacion(data["artesanos"])
+
+
+# -------------------- Resúmenes por feria --------------------
+# Cada feria guarda su "resumen" (ocupados, total_cupos y ocupados por tipo).
+# Los helpers que mutan ferias/artesanos lo recalculan dentro de la misma
+# transacción, así las vistas solo lo leen. Siempre se asigna un dict nuevo:
+# el snapshot cacheado comparte los objetos anidados con la copia en curso.
+
+def _resumir(feria, oc):
+    fid = feria.get("id")
+    tipos = [
+        {"tipo": tp.get("tipo"), "cupos": int(tp.get("cupos") or 0), "ocupados": oc.tipo(fid, tp.get("tipo"))}
+        for tp in feria.get("tipos_productos", [])
+    ]
+    return {
+        "ocupados": oc.feria(fid),
+        "total_cupos": sum(tp["cupos"] for tp in tipos) or feria.get("cupos_totales") or feria.get("cupos") or 0,
+        "tipos": tipos,
+    }
+
+
+def _actualizar_resumenes(feria_ids, oc=None):
+    """Recalcula resumen y ocupados de las ferias indicadas (dentro de una transacción)."""
+    oc = oc or ocupacion()
+    for feria_id in feria_ids:
+        feria = buscar("ferias", feria_id)
+        if feria is not None:
+            feria["resumen"] = _resumir(feria, oc)
+            feria["ocupados"] = feria["resumen"]["ocupados"]
+            _anotar("ferias", feria_id)
+
+
+def _diferencias_resumenes(data, oc):
+    return [
+        (f["id"], f.get("resumen"), _resumir(f, oc))
+        for f in data["ferias"]
+        if f.get("resumen") != _resumir(f, oc) or f.get("ocupados") != oc.feria(f["id"])
+    ]
+
+
+def reconstruir_resumenes(verificar=False):
+    """
+    Recalcula los resúmenes de todas las ferias contando los artesanos desde cero.
+    Devuelve [(feria_id, guardado, calculado)] de los que no coincidían;
+    con verificar=True solo compara, sin escribir.
+    """
+    if verificar:
+        data = get_data()
+        return _diferencias_resumenes(data, Ocupacion(data["artesanos"]))
+    with transaction() as data:
+        _local.ocupacion = Ocupacion(data["artesanos"])
+        diferencias = _diferencias_resumenes(data, _local.ocupacion)
+        if diferencias:
+            _actualizar_resumenes([fid for fid, _, _ in diferencias], _local.ocupacion)
+    return diferencias
+
+
+# -------------------- Ferias --------------------
+
+def add_feria(feria):
+    with transaction() as data:
+        # Generar ID único
+        feria["id"] = _siguiente_id(data, "ferias")
+
+        # Sanitizar nombre
+        feria["nombre"] = (feria.get("nombre") or "").strip()
+
+        # Asegurar estructura de tipos
+        tipos = feria.get("tipos_productos", []) or []
+        for tp in tipos:
+            tp["tipo"] = (tp.get("tipo") or "").strip()
+            tp["cupos"] = int(tp.get("cupos") or 0)
+
+        feria["tipos_productos"] = tipos
+        feria["cupos_totales"] = sum(tp.get("cupos", 0) for tp in tipos)
+        feria["ocupados"] = 0
+
+        data["ferias"].append(feria)
+        _indexar("ferias", feria)
+        _actualizar_resumenes([feria["id"]])
+    sync_ferias_db([feria])
+
+
+def delete_feria(feria_id):
+    feria_id = int(feria_id)
+    with transaction() as data:
+        oc = ocupacion()  # antes de mutar la lista de artesanos
+
+        # eliminar feria
+        feria = buscar("ferias", feria_id)
+        if feria is not None:
+            data["ferias"] = [f for f in data["ferias"] if f is not feria]
+            _desindexar("ferias", feria_id)
+
+        # eliminar artesanos y solicitudes asociadas
+        for a in data["artesanos"]:
+            if int(a.get("feria_id", -1)) == feria_id:
+                oc.quitar(a)
+        data["artesanos"] = [a for a in data["artesanos"] if int(a.get("feria_id", -1)) != feria_id]
+        data["solicitudes"] = [s for s in data["solicitudes"] if int(s.get("feria_id", -1)) != feria_id]
+        _desindexar("artesanos")
+        _desindexar("solicitudes")
+
+    from .models import Feria
+    Feria.objects.filter(json_id=feria_id).delete()
+
+
+def edit_feria(feria_id, new_data):
+    feria_id = int(feria_id)
+    with transaction():
+        f = buscar("ferias", feria_id)
+        if f is not None:
+            f.update(new_data or {})
+            # Normalizar tipos si vinieron
+            if "tipos_productos" in (new_data or {}):
+                tipos = f.get("tipos_productos", []) or []
+                for tp in tipos:
+                    tp["tipo"] = (tp.get("tipo") or "").strip()
+                    tp["cupos"] = int(tp.get("cupos") or 0)
+                f["tipos_productos"] = tipos
+                f["cupos_totales"] = sum(tp.get("cupos", 0) for tp in tipos)
+            _actualizar_resumenes([feria_id])
+    if f is not None:
+        sync_ferias_db([f])
+
+
+# -------------------- Filas Feria (favoritos) --------------------
+
+# Campo de Feria que guarda el id que usan el documento y las vistas
+FERIA_ID_FIELD = "json_id"
+
+
+def sync_ferias_db(ferias=None):
+    """
+    Crea/actualiza en bloque (bulk_create/bulk_update) las filas Feria que reflejan
+    las ferias del JSON, emparejadas por json_id. Se llama al crear/editar ferias,
+    así las vistas no tienen que sincronizar nada. Las filas sin json_id (de antes
+    de enlazarlas) se emparejan por nombre, así conservan sus favoritos.
+    """
+    from .models import Feria
+
+    if ferias is None:
+        ferias = get_data()["ferias"]
+    campos = ["json_id", "nombre", "fecha_inicio", "fecha_fin", "preferencias", "ocupados"]
+    existentes = Feria.objects.in_bulk([int(f["id"]) for f in ferias], field_name="json_id")
+    enlazadas = set()
+    if len(existentes) < len(ferias):
+        sueltas = {}
+        for obj in Feria.objects.filter(json_id__isnull=True).order_by("id"):
+            sueltas.setdefault(obj.nombre, obj)
+        for f in ferias:
+            obj = None if int(f["id"]) in existentes else sueltas.pop(f.get("nombre", f"Feria {f.get('id')}"), None)
+            if obj is not None:
+                obj.json_id = int(f["id"])
+                existentes[obj.json_id] = obj
+                enlazadas.add(obj.json_id)
+
+    nuevas, cambiadas = [], []
+    for f in ferias:
+        valores = {
+            "nombre": f.get("nombre", f"Feria {f.get('id')}"),
+            "fecha_inicio": parse_date(f.get("fecha_inicio") or "") or parse_date("2000-01-01"),
+            "fecha_fin": parse_date(f.get("fecha_fin") or "") or parse_date("2000-01-01"),
+            "preferencias": f.get("preferencias", "") or "",
+            "ocupados": f.get("ocupados", 0) or 0,
+        }
+        obj = existentes.get(int(f["id"]))
+        if obj is None:
+            nuevas.append(Feria(json_id=int(f["id"]), **valores))
+        elif int(f["id"]) in enlazadas or any(getattr(obj, k) != v for k, v in valores.items()):
+            for k, v in valores.items():
+                setattr(obj, k, v)
+            cambiadas.append(obj)
+
+    Feria.objects.bulk_create(nuevas)
+    Feria.objects.bulk_update(cambiadas, campos)
+    return len(nuevas), len(cambiadas)
+
+
+# -------------------- Artesanos (aprobados) --------------------
+
+def _cupos_disponibles_para_tipo(feria, tipo):
+    """Devuelve (ocupados_tipo, cupos_tipo) para la feria y tipo dados."""
+    cupos_tipo = 0
+    for tp in feria.get("tipos_productos", []):
+        if tp.get("tipo") == tipo:
+            cupos_tipo = int(tp.get("cupos") or 0)
+            break
+    return ocupacion().tipo(feria["id"], tipo), cupos_tipo
+
+
+def add_artesano(artesano):
+    """
+    Se usa al APROBAR una solicitud.
+    Valida cupos por tipo según la feria (no un tope fijo).
+    """
+    with transaction(diario=True) as data:
+        feria = buscar("ferias", artesano["feria_id"])
+        if not feria:
+            raise ValueError("Feria no encontrada")
+
+        tipo = artesano.get("tipo")
+        # verificar que el tipo exista en la feria
+        if not any(tp.get("tipo") == tipo for tp in feria.get("tipos_productos", [])):
+            raise ValueError("Tipo no disponible en esta feria")
+
+        ocupados_tipo, cupos_tipo = _cupos_disponibles_para_tipo(feria, tipo)
+        if cupos_tipo == 0 or ocupados_tipo >= cupos_tipo:
+            raise ValueError("¡Máximo de artesanos alcanzado para esta categoría!")
+
+        # Asignar ID incremental real
+        nuevo = {
+            "id": _siguiente_id(data, "artesanos"),
+            "nombre": artesano.get("nombre", "").strip(),
+            "tipo": tipo,
+            "descripcion": artesano.get("descripcion", "").strip(),
+            "feria_id": int(artesano["feria_id"]),
+        }
+        data["artesanos"].append(nuevo)
+        _indexar("artesanos", nuevo)
+        _anotar("artesanos", nuevo["id"])
+
+        # Actualizar ocupados y resumen de la feria
+        oc = ocupacion()
+        oc.agregar(nuevo)
+        _actualizar_resumenes([feria["id"]], oc)
+
+
+def delete_artesano(artesano_id):
+    artesano_id = int(artesano_id)
+    with transaction(diario=True) as data:
+        oc = ocupacion()  # antes de mutar la lista
+        borrado = buscar("artesanos", artesano_id)
+        if not borrado:
+            return
+        data["artesanos"] = [a for a in data["artesanos"] if a is not borrado]
+        _desindexar("artesanos", artesano_id)
+        _anotar("artesanos", artesano_id)
+
+        # actualizar ocupados de su feria
+        oc.quitar(borrado)
+        _actualizar_resumenes({int(borrado.get("feria_id"))}, oc)
+
+
+def edit_artesano(artesano_id, new_data):
+    artesano_id = int(artesano_id)
+    with transaction(diario=True):
+        oc = ocupacion()
+        a = buscar("artesanos", artesano_id)
+        if not a:
+            return
+        oc.quitar(a)
+        feria_anterior = int(a.get("feria_id"))
+        a.update(new_data or {})
+        oc.agregar(a)
+        _anotar("artesanos", artesano_id)
+
+        # actualizar ocupados de las ferias afectadas
+        _actualizar_resumenes({feria_anterior, int(a.get("feria_id"))}, oc)
+
+
+# -------------------- Solicitudes --------------------
+
+def add_solicitud(solicitud):
+    """
+    Crea una solicitud con estado='pendiente'.
+    Estructura mínima:
+    {
+        "usuario": "...",
+        "user_id": 3,          # opcional; con él la solicitud sigue al usuario aunque cambie de username
+        "nombre": "...",
+        "descripcion": "...",
+        "feria_id": 1,
+        "tipo": "cerámica"
+    }
+    """
+    with transaction(diario=True) as data:
+        solicitud_out = {
+            "id": _siguiente_id(data, "solicitudes"),
+            "usuario": solicitud.get("usuario", ""),
+            "nombre": solicitud.get("nombre", "").strip(),
+            "descripcion": solicitud.get("descripcion", "").strip(),
+            "feria_id": int(solicitud.get("feria_id")),
+            "tipo": solicitud.get("tipo"),
+            "estado": "pendiente",
+            "creado": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        if solicitud.get("user_id"):
+            solicitud_out["user_id"] = int(solicitud["user_id"])
+        data["solicitudes"].append(solicitud_out)
+        _indexar("solicitudes", solicitud_out)
+        _anotar("solicitudes", solicitud_out["id"])
+    return solicitud_out
+
+
+def set_estado_solicitud(solicitud_id, estado):
+    with transaction(diario=True):
+        s = buscar("solicitudes", solicitud_id)
+        if s is not None:
+            s["estado"] = estado
+            _anotar("solicitudes", s["id"])
+
+
+def _aprobar(s):
+    """
+    Aprobación en una sola pasada sobre el documento de la transacción en curso:
+    valida el cupo, agrega el artesano y marca la solicitud. Devuelve False si ya
+    estaba aceptada; lanza ValueError (sin tocar nada) si no hay cupo.
+    """
+    if s.get("estado") == "aceptado":
+        return False
+
+    add_artesano({
+        "nombre": s["nombre"],
+        "tipo": s["tipo"],
+        "descripcion": s["descripcion"],
+        "feria_id": s["feria_id"],
+    })
+    s["estado"] = "aceptado"
+    _anotar("solicitudes", s["id"])
+    return True
+
+
+def aprobar_solicitud(solicitud_id):
+    """Aprueba (valida cupos y agrega a artesanos); setea estado='aceptado'."""
+    # ya aceptada: se responde desde el cache, sin lock ni escritura
+    actual = buscar("solicitudes", solicitud_id)
+    if actual is not None and actual.get("estado") == "aceptado":
+        return
+
+    with transaction(diario=True):
+        s = buscar("solicitudes", solicitud_id)
+        if not s:
+            raise ValueError("Solicitud no encontrada")
+        _aprobar(s)
+
+
+def aprobar_solicitudes(solicitud_ids):
+    """Aprueba varias solicitudes con una sola carga y una sola escritura (ver moderar_solicitudes)."""
+    return moderar_solicitudes(solicitud_ids, "aprobar")
+
+
+def _orden_moderacion(s):
+    # por (feria, tipo) y, dentro de cada cupo, la más antigua primero
+    # (las solicitudes viejas no tienen "creado": el id sigue el orden de llegada)
+    return (int(s.get("feria_id", 0)), s.get("tipo") or "", s.get("creado") or "", int(s.get("id", 0)))
+
+
+def moderar_solicitudes(solicitud_ids, accion):
+    """
+    Aprueba o rechaza un lote de solicitudes en una sola transacción.
+    accion: "aprobar" | "rechazar". Se procesan en orden determinista
+    (feria, tipo, antigüedad) para que los cupos se asignen igual siempre.
+    Devuelve [{"id", "ok", "mensaje"}] en el orden en que se procesaron.
+    """
+    if accion not in ("aprobar", "rechazar"):
+        raise ValueError("Acción no válida")
+
+    resultados = []
+    with transaction(diario=True):
+        encontradas = []
+        for sid in dict.fromkeys(solicitud_ids):
+            s = buscar("solicitudes", sid)
+            if s is None:
+                resultados.append({"id": sid, "ok": False, "mensaje": "Solicitud no encontrada"})
+            else:
+                encontradas.append(s)
+
+        for s in sorted(encontradas, key=_orden_moderacion):
+            sid = s["id"]
+            if accion == "rechazar":
+                if s.get("estado") == "aceptado":
+                    resultados.append({"id": sid, "ok": False, "mensaje": "Ya estaba aceptada"})
+                else:
+                    s["estado"] = "rechazado"
+                    _anotar("solicitudes", sid)
+                    resultados.append({"id": sid, "ok": True, "mensaje": "Rechazada"})
+                continue
+            try:
+                aprobada = _aprobar(s)
+            except ValueError as e:
+                resultados.append({"id": sid, "ok": False, "mensaje": str(e)})
+                continue
+            resultados.append({"id": sid, "ok": True, "mensaje": "Aprobada" if aprobada else "Ya estaba aceptada"})
+    return resultados
+
+
+def rechazar_solicitud(solicitud_id):
+    set_estado_solicitud(solicitud_id, "rechazado")
+
+
+def delete_solicitudes_usuario(user_id, username):
+    """Borra las solicitudes de un usuario (por user_id o, si hay viejas, por username). Devuelve cuántas."""
+    with transaction(diario=True) as data:
+        borradas = solicitudes_de(username, user_id)
+        if borradas:
+            ids = {s["id"] for s in borradas}
+            data["solicitudes"] = [s for s in data["solicitudes"] if s["id"] not in ids]
+            for s in borradas:
+                _desindexar("solicitudes", s["id"], s)
+                _anotar("solicitudes", s["id"])
+        return len(borradas)
+
+
+# -------------------- Archivo histórico --------------------
+
+def archivar(hoy=None, dias=None, simular=False):
+    """
+    Mueve ferias terminadas (con sus artesanos y solicitudes) y solicitudes resueltas
+    viejas a los archivos por año (ver archivo.py). Devuelve {año: {colección: cantidad}};
+    con simular=True solo informa.
+    """
+    from . import archivo
+
+    dias = archivo.DIAS_SOLICITUDES if dias is None else dias
+    # sin nada que archivar no se toma el lock ni se reescribe el documento
+    lotes = archivo.seleccionar(get_data(), hoy, dias)
+    if simular or not lotes:
+        return archivo.conteo(lotes)
+
+    with transaction() as data:
+        lotes = archivo.seleccionar(data, hoy, dias)
+        archivo.guardar(lotes)
+        quitar = archivo.ids(lotes)
+        for coleccion, ids in quitar.items():
+            if ids:
+                data[coleccion] = [x for x in data[coleccion] if int(x.get("id")) not in ids]
+                _desindexar(coleccion)
+        _local.ocupacion = None  # se vuelve a contar sin los artesanos archivados
+
+    from .models import Feria
+    Feria.objects.filter(json_id__in=quitar["ferias"]).delete()
+    return archivo.conteo(lotes)
+
+
+# -------------------- Utilidades para vistas --------------------
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _texto(campo):
+    return lambda x: (x.get(campo) or "").lower()
+
+
+# orden permitido (nombre del parámetro -> clave de ordenamiento); "-campo" = descendente
+ORDEN_ARTESANOS = {
+    "id": lambda a: int(a.get("id", 0)),
+    "nombre": _texto("nombre"),
+    "tipo": _texto("tipo"),
+    "feria": lambda a: int(a.get("feria_id", 0)),
+}
+ORDEN_SOLICITUDES = {
+    "id": lambda s: int(s.get("id", 0)),
+    "nombre": _texto("nombre"),
+    "tipo": _texto("tipo"),
+    "estado": _texto("estado"),
+    "usuario": _texto("usuario"),
+    "feria": lambda s: int(s.get("feria_id", 0)),
+}
+
+
+def _ordenar(registros, orden, permitidos, defecto):
+    orden = orden or defecto
+    campo = orden.lstrip("-")
+    if campo not in permitidos:
+        orden, campo = defecto, defecto.lstrip("-")
+    return sorted(registros, key=permitidos[campo], reverse=orden.startswith("-"))
+
+
+def listar_artesanos(q="", feria_id=None, tipo="", orden=""):
+    """Artesanos filtrados (nombre contiene q, feria, tipo) y ordenados; listo para paginar."""
+    q = (q or "").strip().lower()
+    feria_id = _entero(feria_id)
+    artesanos = [
+        a for a in get_data()["artesanos"]
+        if (feria_id is None or int(a.get("feria_id", -1)) == feria_id)
+        and (not tipo or a.get("tipo") == tipo)
+        and (not q or q in (a.get("nombre") or "").lower())
+    ]
+    return _ordenar(artesanos, orden, ORDEN_ARTESANOS, "nombre")
+
+
+def listar_solicitudes(estado="", feria_id=None, tipo="", usuario="", orden=""):
+    """Solicitudes filtradas por estado/feria/tipo/usuario y ordenadas (por defecto, las más nuevas primero)."""
+    feria_id = _entero(feria_id)
+    solicitudes = [
+        s for s in (solicitudes_de(usuario) if usuario else get_data()["solicitudes"])
+        if (not estado or s.get("estado") == estado)
+        and (feria_id is None or int(s.get("feria_id", -1)) == feria_id)
+        and (not tipo or s.get("tipo") == tipo)
+        and (not usuario or s.get("usuario") == usuario)
+    ]
+    return _ordenar(solicitudes, orden, ORDEN_SOLICITUDES, "-id")
+
+
+def buscar_texto(consulta, limite=500):
+    """Búsqueda de la página pública: [(clase, id, puntaje)] por relevancia (índice en busqueda.py)."""
+    from . import busqueda
+    return busqueda.buscar_texto(consulta, limite)
+
+
+def ferias_tipos_map():
+    """
+    Devuelve { "feria_id_str": ["tipo1","tipo2", ...], ... }
+    Útil para poblar el <select> de tipos en el panel del artesano vía JS.
+    """
+    mapa = {}
+    for f in ferias():
+        fid = str(f.get("id"))
+        mapa[fid] = [tp.get("tipo") for tp in f.get("tipos_productos", [])]
+    return mapa
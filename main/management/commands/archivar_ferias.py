@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from main import archivo, utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve las ferias terminadas (con sus artesanos y solicitudes) y las solicitudes resueltas "
+        "viejas a main/data/archivo/ferias-<año>.json. Con --cada HORAS queda corriendo "
+        "(p. ej. como proceso aparte en el Procfile)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=archivo.DIAS_SOLICITUDES,
+                            help="Antigüedad mínima de las solicitudes resueltas a archivar")
+        parser.add_argument("--hoy", type=str, help="Fecha de referencia YYYY-MM-DD (por defecto, hoy)")
+        parser.add_argument("--simular", action="store_true", help="Muestra lo que se archivaría, sin mover nada")
+        parser.add_argument("--cada", type=float, help="Repetir cada tantas horas")
+
+    def handle(self, *args, **opts):
+        hoy = None
+        if opts.get("hoy"):
+            hoy = parse_date(opts["hoy"])
+            if hoy is None:
+                raise CommandError("--hoy debe tener formato YYYY-MM-DD")
+
+        while True:
+            self._archivar(hoy, opts["dias"], opts.get("simular"))
+            if not opts.get("cada"):
+                return
+            time.sleep(opts["cada"] * 3600)
+
+    def _archivar(self, hoy, dias, simular):
+        conteo = utils.archivar(hoy=hoy, dias=dias, simular=simular)
+        if not conteo:
+            self.stdout.write("Nada para archivar.")
+            return
+        verbo = "Se archivarían" if simular else "Archivado"
+        for anio, n in conteo.items():
+            self.stdout.write(
+                f"  {anio}: {n['ferias']} ferias, {n['artesanos']} artesanos, {n['solicitudes']} solicitudes"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{verbo} en {len(conteo)} año(s)."))
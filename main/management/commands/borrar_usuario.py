@@ -46,12 +46,7 @@ class Command(BaseCommand):
             )
 
         # --- resumen previo ---
-        data = utils.load_data()
-        solicitudes = data.get("solicitudes", [])
-        a_borrar = [
-            s for s in solicitudes
-            if s.get("user_id") == uid or s.get("usuario") == uname  # compat entradas viejas
-        ]
+        a_borrar = utils.solicitudes_de(uname, uid)  # por user_id o username (entradas viejas)
 
         self.stdout.write(self.style.NOTICE("Resumen:"))
         self.stdout.write(f"  Usuario: {uname} (id={uid}, rol={user.role})")
@@ -70,11 +65,7 @@ class Command(BaseCommand):
         # --- ejecutar ---
         with transaction.atomic():
             user.delete()
-            data["solicitudes"] = [
-                s for s in solicitudes
-                if not (s.get("user_id") == uid or s.get("usuario") == uname)
-            ]
-            utils.save_data(data)
+            utils.delete_solicitudes_usuario(uid, uname)
 
         self.stdout.write(self.style.SUCCESS(
             f"Usuario '{uname}' eliminado y {len(a_borrar)} solicitudes limpiadas."
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main import json_store, utils
+
+
+class Command(BaseCommand):
+    help = "Vuelca el diario de cambios (ferias.diario.jsonl) en ferias.json y lo borra"
+
+    def handle(self, *args, **opts):
+        if utils.BACKEND == "db":
+            self.stdout.write(self.style.WARNING('Con FERIAS_BACKEND=db no hay diario que compactar.'))
+            return
+        compactados = json_store.compactar()
+        self.stdout.write(self.style.SUCCESS(f"Diario compactado ({compactados} bytes) en {json_store.DATA_FILE}"))
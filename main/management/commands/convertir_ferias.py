@@ -0,0 +1,38 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from main import json_store
+
+
+class Command(BaseCommand):
+    help = "Reescribe ferias.json (snapshot + diario) en otro formato: json, json-compacto o msgpack"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--formato", choices=json_store.FORMATOS, default=json_store.FORMATO,
+                            help="Formato de destino (por defecto, FERIAS_FORMATO)")
+
+    def handle(self, *args, **opts):
+        formato = opts["formato"]
+        json_store._ensure_file()
+        with open(json_store.DATA_FILE, "rb") as f:
+            origen = json_store.detectar_formato(f.read())
+        antes = os.path.getsize(json_store.DATA_FILE)
+
+        try:
+            with json_store._file_lock():
+                # copia de primer nivel: save_data le pone una base nueva al documento
+                data = dict(json_store.get_data())
+                json_store.save_data(data, formato)
+        except ImproperlyConfigured as e:  # msgpack sin el paquete instalado
+            raise CommandError(str(e))
+
+        despues = os.path.getsize(json_store.DATA_FILE)
+        self.stdout.write(self.style.SUCCESS(
+            f"{json_store.DATA_FILE}: {origen} ({antes} bytes) -> {formato} ({despues} bytes)"
+        ))
+        if formato != json_store.FORMATO:
+            self.stdout.write(self.style.WARNING(
+                f"FERIAS_FORMATO es {json_store.FORMATO!r}: la próxima escritura completa volverá a ese formato."
+            ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import correos
+
+
+class Command(BaseCommand):
+    help = (
+        "Manda los correos encolados (reset de contraseña, etc.) de a lotes, reintentando los que fallan. "
+        "Con --cada SEGUNDOS queda corriendo (proceso worker del Procfile)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=correos.LOTE, help="Correos por conexión")
+        parser.add_argument("--intentos", type=int, default=correos.MAX_INTENTOS,
+                            help="Intentos antes de dar un correo por perdido")
+        parser.add_argument("--cada", type=float, help="Revisar la cola cada tantos segundos")
+        parser.add_argument("--borrar-dias", type=int, default=correos.DIAS_ENVIADOS,
+                            help="Borrar los correos enviados hace más de tantos días")
+
+    def handle(self, *args, **opts):
+        while True:
+            enviados, fallidos = self._vaciar(opts["lote"], opts["intentos"])
+            if enviados or fallidos or not opts.get("cada"):
+                self.stdout.write(f"Enviados: {enviados}, fallidos: {fallidos}")
+            borrados = correos.borrar_enviados(opts["borrar_dias"])
+            if borrados:
+                self.stdout.write(f"Borrados {borrados} correos viejos ya enviados.")
+            if not opts.get("cada"):
+                return
+            time.sleep(opts["cada"])
+
+    def _vaciar(self, lote, intentos):
+        """Lotes seguidos mientras vengan llenos; los fallidos esperan a su próximo intento."""
+        total_enviados, total_fallidos = 0, 0
+        while True:
+            enviados, fallidos = correos.enviar_pendientes(lote, intentos)
+            total_enviados += enviados
+            total_fallidos += fallidos
+            if enviados + fallidos < lote:
+                return total_enviados, total_fallidos
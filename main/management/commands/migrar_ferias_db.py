@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main import db_store, json_store, utils
+
+
+class Command(BaseCommand):
+    help = "Copia ferias, artesanos y solicitudes de ferias.json a la base de datos (o al revés con --exportar)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--exportar", action="store_true",
+                            help="Escribe el contenido de la base de datos en ferias.json")
+
+    def handle(self, *args, **opts):
+        if opts.get("exportar"):
+            data = db_store.get_data()
+            json_store.save_data(data)
+            self.stdout.write(self.style.SUCCESS(
+                f"Exportadas {len(data['ferias'])} ferias, {len(data['artesanos'])} artesanos "
+                f"y {len(data['solicitudes'])} solicitudes a {json_store.DATA_FILE}"
+            ))
+            return
+
+        data = json_store.get_data()
+        with transaction.atomic():
+            mapa = db_store.importar_documento(data)
+            db_store.reconstruir_resumenes()
+            db_store.invalidate_cache()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importadas {len(mapa)} ferias, {len(data['artesanos'])} artesanos "
+            f"y {len(data['solicitudes'])} solicitudes desde {json_store.DATA_FILE}"
+        ))
+        if utils.BACKEND != "db":
+            self.stdout.write(self.style.WARNING(
+                'El backend activo sigue siendo "json"; usa FERIAS_BACKEND=db para trabajar sobre la base.'
+            ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import utils
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes de ocupación de cada feria (o solo los compara con --verificar)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verificar", action="store_true",
+                            help="Solo compara con un conteo desde cero; falla si hay diferencias")
+
+    def handle(self, *args, **opts):
+        verificar = opts.get("verificar")
+        diferencias = utils.reconstruir_resumenes(verificar=verificar)
+
+        for feria_id, guardado, calculado in diferencias:
+            antes = guardado["ocupados"] if guardado else "sin resumen"
+            self.stdout.write(f"  Feria {feria_id}: ocupados {antes} -> {calculado['ocupados']}")
+
+        if verificar and diferencias:
+            raise CommandError(f"{len(diferencias)} feria(s) con el resumen desactualizado.")
+        if verificar:
+            self.stdout.write(self.style.SUCCESS("Todos los resúmenes coinciden."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Resúmenes corregidos: {len(diferencias)}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import utils
+
+
+class Command(BaseCommand):
+    help = "Crea/actualiza en bloque las filas Feria (json_id) a partir de ferias.json"
+
+    def handle(self, *args, **opts):
+        nuevas, cambiadas = utils.sync_ferias_db()
+        self.stdout.write(self.style.SUCCESS(f"Ferias creadas: {nuevas}, actualizadas: {cambiadas}"))
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_customuser_ferias_favoritas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtesanoFeria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('tipo', models.CharField(max_length=50)),
+                ('descripcion', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TipoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('cupos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='solicitudferia',
+            name='usuario',
+            field=models.CharField(blank=True, db_index=True, max_length=150),
+        ),
+        migrations.AlterField(
+            model_name='solicitudferia',
+            name='estado',
+            field=models.CharField(db_index=True, default='pendiente', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='solicitudferia',
+            name='feria_id',
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='solicitudferia',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='solicitudes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudferia',
+            index=models.Index(fields=['feria_id', 'tipo'], name='solicitud_feria_tipo_idx'),
+        ),
+        migrations.AddField(
+            model_name='artesanoferia',
+            name='feria',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artesanos', to='main.feria'),
+        ),
+        migrations.AddField(
+            model_name='tipoproducto',
+            name='feria',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tipos_productos', to='main.feria'),
+        ),
+        migrations.AddIndex(
+            model_name='artesanoferia',
+            index=models.Index(fields=['feria', 'tipo'], name='artesano_feria_tipo_idx'),
+        ),
+    ]
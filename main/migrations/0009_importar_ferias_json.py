@@ -0,0 +1,15 @@
+from django.db import migrations
+
+# Esta migración copiaba ferias.json a las tablas con código de la app (utils,
+# db_store): si ese código cambiaba, cambiaba también una migración ya aplicada,
+# y con el backend "json" la copia quedaba vieja. Ahora no hace nada; los datos se
+# cargan con `manage.py migrar_ferias_db` al pasar a FERIAS_BACKEND=db.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_ferias_en_db'),
+    ]
+
+    operations = []
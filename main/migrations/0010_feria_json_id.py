@@ -0,0 +1,81 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:43
+
+import json
+import os
+
+from django.db import migrations, models
+
+# Autocontenida a propósito (sin importar utils/db_store): lee ferias.json tal como
+# está en disco. Más adelante sync_ferias_db mantiene el enlace al crear/editar ferias.
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "ferias.json")
+
+
+def _ferias_json():
+    """Ferias del snapshot (JSON o msgpack) con los cambios de su diario aplicados."""
+    try:
+        with open(DATA_FILE, "rb") as f:
+            crudo = f.read()
+    except FileNotFoundError:
+        return []
+    if crudo.lstrip()[:1] in (b"{", b""):
+        data = json.loads(crudo or b"{}")
+    else:
+        import msgpack
+
+        data = msgpack.unpackb(crudo, raw=False)
+
+    ferias = {int(f["id"]): f for f in data.get("ferias", [])}
+    try:
+        with open(os.path.splitext(DATA_FILE)[0] + ".diario.jsonl", "rb") as f:
+            lineas = f.read().split(b"\n")[:-1]
+    except FileNotFoundError:
+        lineas = []
+    for i, linea in enumerate(lineas):
+        try:
+            registro = json.loads(linea)
+        except ValueError:
+            break
+        if i == 0:
+            if registro.get("base") != data.get("diario"):
+                break  # diario de otro snapshot
+            continue
+        for op in registro.get("ops", []):
+            if op["col"] != "ferias":
+                continue
+            if "reg" in op:
+                ferias[int(op["reg"]["id"])] = op["reg"]
+            else:
+                ferias.pop(int(op["id"]), None)
+    return list(ferias.values())
+
+
+def enlazar_ferias_json(apps, schema_editor):
+    """Asigna json_id a las filas Feria que ya existían, emparejando por nombre (así conservan sus favoritos)."""
+    Feria = apps.get_model("main", "Feria")
+    por_nombre = {}
+    for obj in Feria.objects.filter(json_id__isnull=True).order_by("id"):
+        por_nombre.setdefault(obj.nombre, obj)
+
+    enlazadas = []
+    for f in _ferias_json():
+        obj = por_nombre.pop(f.get("nombre", f"Feria {f.get('id')}"), None)
+        if obj is not None:
+            obj.json_id = int(f["id"])
+            enlazadas.append(obj)
+    Feria.objects.bulk_update(enlazadas, ["json_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_importar_ferias_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feria',
+            name='json_id',
+            field=models.IntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(enlazar_ferias_json, migrations.RunPython.noop),
+    ]
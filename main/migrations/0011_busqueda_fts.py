@@ -0,0 +1,112 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+from django.db import migrations
+
+# Índice FTS5 de la búsqueda pública (backend db). rowid = id * 4 + clase,
+# así los triggers ubican la fila sin recorrer la tabla.
+#   0 = feria, 1 = artesano (ArtesanoFeria), 2 = producto
+
+FERIA = """
+    INSERT INTO main_busqueda(rowid, nombre, etiquetas, descripcion)
+    SELECT f.id * 4, f.nombre,
+           COALESCE((SELECT group_concat(tipo, ' ') FROM main_tipoproducto WHERE feria_id = f.id), ''),
+           f.preferencias
+    FROM main_feria f WHERE {filtro};
+"""
+ARTESANO = """
+    INSERT INTO main_busqueda(rowid, nombre, etiquetas, descripcion)
+    SELECT a.id * 4 + 1, a.nombre, a.tipo, a.descripcion FROM main_artesanoferia a WHERE {filtro};
+"""
+PRODUCTO = """
+    INSERT INTO main_busqueda(rowid, nombre, etiquetas, descripcion)
+    SELECT p.id * 4 + 2, p.nombre, (SELECT nombre FROM main_artesano WHERE id = p.artesano_id), p.descripcion
+    FROM main_producto p WHERE {filtro};
+"""
+
+SQL_CREAR = [
+    """CREATE VIRTUAL TABLE main_busqueda USING fts5(
+        nombre, etiquetas, descripcion, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    FERIA.format(filtro="1"),
+    ARTESANO.format(filtro="1"),
+    PRODUCTO.format(filtro="1"),
+
+    # ferias (y sus tipos, que van en las etiquetas)
+    "CREATE TRIGGER main_busqueda_feria_ai AFTER INSERT ON main_feria BEGIN"
+    + FERIA.format(filtro="f.id = NEW.id") + "END",
+    "CREATE TRIGGER main_busqueda_feria_au AFTER UPDATE ON main_feria BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = OLD.id * 4;"
+    + FERIA.format(filtro="f.id = NEW.id") + "END",
+    "CREATE TRIGGER main_busqueda_feria_ad AFTER DELETE ON main_feria BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = OLD.id * 4; END",
+    "CREATE TRIGGER main_busqueda_tipo_ai AFTER INSERT ON main_tipoproducto BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = NEW.feria_id * 4;"
+    + FERIA.format(filtro="f.id = NEW.feria_id") + "END",
+    "CREATE TRIGGER main_busqueda_tipo_au AFTER UPDATE ON main_tipoproducto BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid IN (OLD.feria_id * 4, NEW.feria_id * 4);"
+    + FERIA.format(filtro="f.id IN (OLD.feria_id, NEW.feria_id)") + "END",
+    "CREATE TRIGGER main_busqueda_tipo_ad AFTER DELETE ON main_tipoproducto BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = OLD.feria_id * 4;"
+    + FERIA.format(filtro="f.id = OLD.feria_id") + "END",
+
+    # artesanos de feria
+    "CREATE TRIGGER main_busqueda_artesano_ai AFTER INSERT ON main_artesanoferia BEGIN"
+    + ARTESANO.format(filtro="a.id = NEW.id") + "END",
+    "CREATE TRIGGER main_busqueda_artesano_au AFTER UPDATE ON main_artesanoferia BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = OLD.id * 4 + 1;"
+    + ARTESANO.format(filtro="a.id = NEW.id") + "END",
+    "CREATE TRIGGER main_busqueda_artesano_ad AFTER DELETE ON main_artesanoferia BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = OLD.id * 4 + 1; END",
+
+    # productos (las etiquetas llevan el nombre del artesano dueño)
+    "CREATE TRIGGER main_busqueda_producto_ai AFTER INSERT ON main_producto BEGIN"
+    + PRODUCTO.format(filtro="p.id = NEW.id") + "END",
+    "CREATE TRIGGER main_busqueda_producto_au AFTER UPDATE ON main_producto BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = OLD.id * 4 + 2;"
+    + PRODUCTO.format(filtro="p.id = NEW.id") + "END",
+    "CREATE TRIGGER main_busqueda_producto_ad AFTER DELETE ON main_producto BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid = OLD.id * 4 + 2; END",
+    "CREATE TRIGGER main_busqueda_perfil_au AFTER UPDATE OF nombre ON main_artesano BEGIN "
+    "DELETE FROM main_busqueda WHERE rowid IN (SELECT id * 4 + 2 FROM main_producto WHERE artesano_id = NEW.id);"
+    + PRODUCTO.format(filtro="p.artesano_id = NEW.id") + "END",
+]
+
+TRIGGERS = [
+    "feria_ai", "feria_au", "feria_ad", "tipo_ai", "tipo_au", "tipo_ad",
+    "artesano_ai", "artesano_au", "artesano_ad", "producto_ai", "producto_au", "producto_ad", "perfil_au",
+]
+
+
+def _hay_fts5(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def crear_fts(apps, schema_editor):
+    """Solo en SQLite con FTS5; en otros motores la búsqueda usa el índice en memoria."""
+    if not _hay_fts5(schema_editor):
+        return
+    for sql in SQL_CREAR:
+        schema_editor.execute(sql)
+
+
+def borrar_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for nombre in TRIGGERS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS main_busqueda_{nombre}")
+    schema_editor.execute("DROP TABLE IF EXISTS main_busqueda")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_feria_json_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_fts, borrar_fts),
+    ]
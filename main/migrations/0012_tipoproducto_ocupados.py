@@ -0,0 +1,70 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:05
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# SQLite rehace la tabla al agregar la columna y los triggers de búsqueda (0011)
+# que apuntan a main_tipoproducto no lo permiten: se sacan y se vuelven a crear.
+fts = import_module("main.migrations.0011_busqueda_fts")
+SQL_TRIGGERS = [sql for sql in fts.SQL_CREAR if sql.startswith("CREATE TRIGGER")]
+
+
+def _hay_tabla_busqueda(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'main_busqueda'")
+        return cursor.fetchone() is not None
+
+
+def quitar_triggers(apps, schema_editor):
+    if _hay_tabla_busqueda(schema_editor):
+        for nombre in fts.TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS main_busqueda_{nombre}")
+
+
+def crear_triggers(apps, schema_editor):
+    if _hay_tabla_busqueda(schema_editor):
+        for sql in SQL_TRIGGERS:
+            schema_editor.execute(sql)
+
+
+def contar_ocupados(apps, schema_editor):
+    """Llena TipoProducto.ocupados (y corrige Feria.ocupados) contando los artesanos actuales."""
+    Feria = apps.get_model("main", "Feria")
+    TipoProducto = apps.get_model("main", "TipoProducto")
+    ArtesanoFeria = apps.get_model("main", "ArtesanoFeria")
+
+    por_feria, por_tipo = {}, {}
+    for feria_id, tipo, n in ArtesanoFeria.objects.values_list("feria_id", "tipo").annotate(n=Count("id")).order_by():
+        por_feria[feria_id] = por_feria.get(feria_id, 0) + n
+        por_tipo[(feria_id, tipo)] = n
+
+    tipos = list(TipoProducto.objects.all())
+    for tp in tipos:
+        tp.ocupados = por_tipo.get((tp.feria_id, tp.tipo), 0)
+    TipoProducto.objects.bulk_update(tipos, ["ocupados"])
+    for feria in Feria.objects.all():
+        n = por_feria.get(feria.id, 0)
+        if feria.ocupados != n:
+            Feria.objects.filter(pk=feria.id).update(ocupados=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_triggers, crear_triggers),
+        migrations.AddField(
+            model_name='tipoproducto',
+            name='ocupados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(crear_triggers, quitar_triggers),
+        migrations.RunPython(contar_ocupados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:10
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# mismo problema que en 0012: SQLite rehace main_producto y los triggers de búsqueda estorban
+triggers = import_module("main.migrations.0012_tipoproducto_ocupados")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_tipoproducto_ocupados'),
+    ]
+
+    operations = [
+        migrations.RunPython(triggers.quitar_triggers, triggers.crear_triggers),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_anchos',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_alto',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(triggers.crear_triggers, triggers.quitar_triggers),
+    ]
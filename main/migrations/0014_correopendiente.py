@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_producto_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asunto', models.CharField(max_length=255)),
+                ('cuerpo', models.TextField()),
+                ('html', models.TextField(blank=True)),
+                ('remitente', models.CharField(blank=True, max_length=255)),
+                ('para', models.JSONField(default=list)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(db_index=True)),
+                ('enviado', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
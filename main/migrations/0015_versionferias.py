@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:20
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def crear_fila(apps, schema_editor):
+    VersionFerias = apps.get_model("main", "VersionFerias")
+    VersionFerias.objects.get_or_create(pk=1, defaults={"version": 1, "modificado": timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_correopendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionFerias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('modificado', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(crear_fila, migrations.RunPython.noop),
+    ]
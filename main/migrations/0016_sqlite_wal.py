@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:05
+
+from django.db import migrations
+
+
+def activar_wal(apps, schema_editor):
+    """
+    WAL queda guardado en el archivo de la base, así que alcanza con activarlo una vez
+    (no en cada conexión: eso reescribía db.sqlite3 con cualquier manage.py).
+    """
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+
+class Migration(migrations.Migration):
+    # journal_mode no se puede cambiar dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('main', '0015_versionferias'),
+    ]
+
+    operations = [
+        migrations.RunPython(activar_wal, migrations.RunPython.noop, atomic=False),
+    ]
@@ -21,18 +21,28 @@ class SolicitudFeria(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name="solicitudes"
+        related_name="solicitudes",
+        null=True, blank=True,
     )
+    # username tal como viene en ferias.json (las solicitudes viejas no tienen user)
+    usuario = models.CharField(max_length=150, blank=True, db_index=True)
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True)
-    feria_id = models.IntegerField()
+    feria_id = models.IntegerField(db_index=True)
     tipo = models.CharField(max_length=50)
-    estado = models.CharField(max_length=20, default="pendiente")
+    estado = models.CharField(max_length=20, default="pendiente", db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["feria_id", "tipo"], name="solicitud_feria_tipo_idx"),
+        ]
+
     def __str__(self):
         return f"{self.nombre} ({self.tipo}) - {self.estado}"
 class Feria(models.Model):
+    # id de la feria en ferias.json (backend JSON); las filas se sincronizan al crear/editar
+    json_id = models.IntegerField(null=True, blank=True, unique=True)
     nombre = models.CharField(max_length=100)
     fecha_inicio = models.DateField()
     fecha_fin = models.DateField()
@@ -42,6 +52,49 @@ class Feria(models.Model):
     def __str__(self):
         return self.nombre
 
+
+class TipoProducto(models.Model):
+    feria = models.ForeignKey(Feria, on_delete=models.CASCADE, related_name="tipos_productos")
+    tipo = models.CharField(max_length=50)
+    cupos = models.PositiveIntegerField(default=0)
+    # artesanos aprobados de este tipo (lo mantiene db_store al escribir)
+    ocupados = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.tipo} ({self.cupos})"
+
+
+class ArtesanoFeria(models.Model):
+    """Artesano aprobado en una feria (equivale a data["artesanos"] del JSON)."""
+    feria = models.ForeignKey(Feria, on_delete=models.CASCADE, related_name="artesanos")
+    nombre = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=50)
+    descripcion = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["feria", "tipo"], name="artesano_feria_tipo_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.tipo})"
+
+class VersionFerias(models.Model):
+    """
+    Fila única (pk=1) con la versión de ferias/artesanos para FERIAS_BACKEND=db.
+    db_store la sube dentro de cada escritura, así todos los procesos ven el mismo
+    valor (claves de cache, ETag/Last-Modified, choices de formularios).
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    modificado = models.DateTimeField()
+
+    def __str__(self):
+        return f"v{self.version} ({self.modificado})"
+
 # --- NUEVO: Modelo Artesano y Producto ---
 
 class Artesano(models.Model):
@@ -56,7 +109,60 @@ class Producto(models.Model):
     artesano = models.ForeignKey(Artesano, on_delete=models.CASCADE, related_name='productos')
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True)
+    # foto ya procesada (ver imagenes.py): base "productos/<hash>" + anchos generados
+    imagen = models.CharField(max_length=100, blank=True)
+    imagen_anchos = models.JSONField(default=list, blank=True)
+    imagen_alto = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.nombre
 
+    def _srcset(self, ext):
+        from django.core.files.storage import default_storage
+        from .imagenes import nombre
+
+        return ", ".join(
+            f"{default_storage.url(nombre(self.imagen, ancho, ext))} {ancho}w" for ancho in self.imagen_anchos
+        )
+
+    @property
+    def imagen_srcset_jpg(self):
+        return self._srcset("jpg")
+
+    @property
+    def imagen_srcset_webp(self):
+        return self._srcset("webp")
+
+    @property
+    def imagen_src(self):
+        """JPEG más chico: lo que baja un navegador que no entiende srcset."""
+        from django.core.files.storage import default_storage
+        from .imagenes import nombre
+
+        return default_storage.url(nombre(self.imagen, self.imagen_anchos[0], "jpg")) if self.imagen else ""
+
+    @property
+    def imagen_ancho(self):
+        return self.imagen_anchos[-1] if self.imagen_anchos else 0
+
+
+
+class CorreoPendiente(models.Model):
+    """Bandeja de salida: los correos se encolan en el request y los manda `manage.py enviar_correos`."""
+    asunto = models.CharField(max_length=255)
+    cuerpo = models.TextField()
+    html = models.TextField(blank=True)
+    remitente = models.CharField(max_length=255, blank=True)
+    para = models.JSONField(default=list)
+    creado = models.DateTimeField(auto_now_add=True)
+    intentos = models.PositiveIntegerField(default=0)
+    # cuándo se puede (re)intentar; también sirve de "reserva" mientras un worker lo está mandando
+    proximo_intento = models.DateTimeField(db_index=True)
+    enviado = models.DateTimeField(null=True, blank=True, db_index=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.asunto} -> {', '.join(self.para)}"
@@ -0,0 +1,76 @@
+// Listas de artesanos de public.html y user_panel.html: se piden a la API de a
+// páginas (cada página una sola vez) y se pintan en la lista, con "Ver más".
+//
+//   const mostrarArtesanos = listaArtesanos("{% url 'api_feria_artesanos' 0 %}", "artesanos-list");
+//   mostrarArtesanos(feriaId);                 // artesanos de una feria
+//
+//   todosLosArtesanos("{% url 'api_artesanos' %}", "todos-artesanos")();   // todos, con su feria
+
+function _artesanosPaginados(contenedorId, vacio) {
+  const artesanosList = document.getElementById(contenedorId);
+  const paginas = {};
+  let urlMostrada = null;
+
+  function escapar(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto || '';
+    return div.innerHTML;
+  }
+
+  function cargar(url, page) {
+    const clave = `${url}?page=${page}`;
+    if (!paginas[clave]) {
+      paginas[clave] = fetch(clave)
+        .then(r => r.ok ? r.json() : Promise.reject(r.status))
+        .catch(() => { delete paginas[clave]; return {artesanos: [], next: null}; });
+    }
+    return paginas[clave];
+  }
+
+  function pintar(url, data, reemplazar) {
+    if (urlMostrada !== url) return;
+    const lista = (data.artesanos || []).filter(a => a && a.nombre && a.nombre.trim() !== "");
+    const html = lista.map(a => `
+      <li style="padding:10px; border-bottom:1px solid rgba(255,255,255,0.1);">
+        <b>${escapar(a.nombre)}</b>${a.tipo ? ' (' + escapar(a.tipo) + ')' : ''}${a.descripcion ? ' - ' + escapar(a.descripcion) : ''}${a.feria ? ' <span style="color:#00e0ff;">— Feria: ' + escapar(a.feria) + '</span>' : ''}
+      </li>
+    `).join("");
+    const verMas = artesanosList.querySelector('.ver-mas');
+    if (verMas) verMas.remove();
+    if (reemplazar) {
+      artesanosList.innerHTML = html || `<li>${vacio}</li>`;
+    } else {
+      artesanosList.insertAdjacentHTML('beforeend', html);
+    }
+    if (data.next) {
+      const li = document.createElement('li');
+      li.className = 'ver-mas';
+      li.innerHTML = '<button type="button">Ver más</button>';
+      li.querySelector('button').onclick = () => {
+        cargar(url, data.next).then(d => pintar(url, d, false));
+      };
+      artesanosList.appendChild(li);
+    }
+  }
+
+  return function mostrar(url) {
+    if (!artesanosList || urlMostrada === url) return;
+    urlMostrada = url;
+    artesanosList.innerHTML = "<li>Cargando artesanos...</li>";
+    cargar(url, 1).then(data => pintar(url, data, true));
+  };
+}
+
+function listaArtesanos(apiUrl, contenedorId) {
+  const mostrar = _artesanosPaginados(contenedorId, 'No hay artesanos registrados en esta feria.');
+  return function mostrarArtesanos(feriaId) {
+    if (feriaId != null) mostrar(apiUrl.replace('/0/', `/${feriaId}/`));
+  };
+}
+
+function todosLosArtesanos(apiUrl, contenedorId) {
+  const mostrar = _artesanosPaginados(contenedorId, 'No hay artesanos registrados');
+  return function mostrarTodos() {
+    mostrar(apiUrl);
+  };
+}
@@ -0,0 +1,371 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from PIL import Image
+
+from main import correos, db_store, imagenes, json_store, utils, views
+from main.models import Artesano, CorreoPendiente, CustomUser, Producto, SolicitudFeria
+
+
+class ConsultasPanelArtesanoTests(TestCase):
+    """
+    artesano_panel y editar_perfil_artesano hacen las mismas consultas tengan
+    3 o 40 productos (nada de un SELECT/UPDATE por producto).
+    """
+    # panel: perfil + productos; editar (GET): perfil + productos;
+    # editar (POST): perfil, productos, UPDATE perfil y savepoint con un bulk_update y un bulk_create
+    CONSULTAS_PANEL = 2
+    CONSULTAS_EDITAR_GET = 2
+    CONSULTAS_EDITAR_POST = 7
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # copia de ferias.json: los tests no tocan el archivo del repo
+        cls._tmp = tempfile.mkdtemp()
+        cls._data_file = json_store.DATA_FILE
+        json_store.DATA_FILE = os.path.join(cls._tmp, "ferias.json")
+        if os.path.exists(cls._data_file):
+            shutil.copy(cls._data_file, json_store.DATA_FILE)
+        utils.invalidate_cache()
+
+    @classmethod
+    def tearDownClass(cls):
+        json_store.DATA_FILE = cls._data_file
+        utils.invalidate_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="artesano", email="artesano@example.com", password="x", role="artesano",
+        )
+        self.artesano = Artesano.objects.create(usuario=self.user, nombre="Artesano", descripcion="")
+        self.client.force_login(self.user)
+
+    def _productos(self, cantidad):
+        Producto.objects.bulk_create(
+            Producto(artesano=self.artesano, nombre=f"Producto {i}", descripcion="") for i in range(cantidad)
+        )
+        return list(Producto.objects.filter(artesano=self.artesano).order_by("id"))
+
+    def _post_editar(self, productos):
+        """Formulario de editar_perfil_artesano cambiando todos los productos y agregando uno."""
+        datos = {
+            "nombre": "Artesano editado",
+            "descripcion": "",
+            "form-TOTAL_FORMS": str(len(productos)),
+            "form-INITIAL_FORMS": str(len(productos)),
+            "form-MIN_NUM_FORMS": "0",
+            "form-MAX_NUM_FORMS": "1000",
+            "nuevo_producto_nombre": "Nuevo",
+            "nuevo_producto_desc": "",
+        }
+        for i, p in enumerate(productos):
+            datos[f"form-{i}-id"] = str(p.pk)
+            datos[f"form-{i}-nombre"] = f"{p.nombre} editado"
+            datos[f"form-{i}-descripcion"] = "otra"
+        return datos
+
+    def _medir(self, cantidad):
+        productos = self._productos(cantidad)
+        url_panel = reverse("artesano_panel")
+        url_editar = reverse("editar_perfil_artesano")
+        self.client.get(url_panel)  # calienta el cache del documento y del usuario
+
+        with self.assertNumQueries(self.CONSULTAS_PANEL):
+            self.assertEqual(self.client.get(url_panel).status_code, 200)
+        with self.assertNumQueries(self.CONSULTAS_EDITAR_GET):
+            self.assertEqual(self.client.get(url_editar).status_code, 200)
+        with self.assertNumQueries(self.CONSULTAS_EDITAR_POST):
+            respuesta = self.client.post(url_editar, self._post_editar(productos))
+        self.assertRedirects(respuesta, url_panel, fetch_redirect_response=False)
+
+        self.assertEqual(Producto.objects.filter(artesano=self.artesano).count(), cantidad + 1)
+        self.assertEqual(Producto.objects.filter(artesano=self.artesano, descripcion="otra").count(), cantidad)
+
+    def test_pocos_productos(self):
+        self._medir(3)
+
+    def test_muchos_productos(self):
+        self._medir(40)
+
+
+class DocumentoTemporalTestCase(TestCase):
+    """ferias.json (y su diario) en una carpeta temporal, vacío al empezar cada test."""
+
+    def setUp(self):
+        self._tmp = tempfile.mkdtemp()
+        self._data_file = json_store.DATA_FILE
+        json_store.DATA_FILE = os.path.join(self._tmp, "ferias.json")
+        json_store.save_data({"ferias": [], "artesanos": [], "solicitudes": []})
+
+    def tearDown(self):
+        json_store.DATA_FILE = self._data_file
+        json_store.invalidate_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _solicitud(self, nombre, feria_id=1, tipo="Cerámica"):
+        return json_store.add_solicitud({"usuario": "u", "nombre": nombre, "descripcion": "", "feria_id": feria_id, "tipo": tipo})
+
+
+class DiarioTests(DocumentoTemporalTestCase):
+    def test_linea_cortada_no_pierde_lo_que_sigue(self):
+        primera = self._solicitud("primera")
+        # una escritura que se cortó a la mitad (sin el salto de línea)
+        with open(json_store._archivo_diario(), "ab") as f:
+            f.write(b'{"ops":[{"col":"solicitudes","reg":{"id"')
+        segunda = self._solicitud("segunda")
+
+        json_store.invalidate_cache()
+        self.assertEqual(json_store.buscar("solicitudes", segunda["id"])["nombre"], "segunda")
+        tercera = self._solicitud("tercera")
+        self.assertEqual([primera["id"] + 1, primera["id"] + 2], [segunda["id"], tercera["id"]])
+
+        json_store.compactar()
+        json_store.invalidate_cache()
+        self.assertEqual([s["nombre"] for s in json_store.get_data()["solicitudes"]], ["primera", "segunda", "tercera"])
+        self.assertFalse(os.path.exists(json_store._archivo_diario()))
+
+
+class TransaccionTests(DocumentoTemporalTestCase):
+    def setUp(self):
+        super().setUp()
+        json_store.add_feria({
+            "nombre": "Feria", "fecha_inicio": "2030-01-01", "fecha_fin": "2030-01-02",
+            "tipos_productos": [{"tipo": "Cerámica", "cupos": 2}],
+        })
+
+    def _cupos(self):
+        return json_store.get_data()["ferias"][0]["tipos_productos"][0]["cupos"]
+
+    def test_guarda_al_salir(self):
+        with json_store.transaction() as data:
+            data["ferias"][0]["tipos_productos"][0]["cupos"] = 5
+        json_store.invalidate_cache()
+        self.assertEqual(self._cupos(), 5)
+
+    def test_excepcion_no_escribe_ni_toca_el_cache(self):
+        with self.assertRaises(RuntimeError):
+            with json_store.transaction() as data:
+                data["ferias"][0]["tipos_productos"][0]["cupos"] = 99
+                data["ferias"][0]["tipos_productos"].append({"tipo": "Textil", "cupos": 1})
+                raise RuntimeError
+        self.assertEqual(self._cupos(), 2)
+        self.assertEqual(len(json_store.get_data()["ferias"][0]["tipos_productos"]), 1)
+        json_store.invalidate_cache()
+        self.assertEqual(self._cupos(), 2)
+
+    def test_load_data_es_una_copia(self):
+        data = json_store.load_data()
+        data["ferias"][0]["tipos_productos"][0]["cupos"] = 99
+        self.assertEqual(self._cupos(), 2)
+
+    def test_helpers_anidados_comparten_la_transaccion(self):
+        with json_store.transaction() as data:
+            solicitud = self._solicitud("anidada")
+            # el helper escribe en el documento en curso, y nada llega al archivo todavía
+            self.assertIs(json_store.get_data(), data)
+            self.assertIn(solicitud, data["solicitudes"])
+            data["ferias"][0]["nombre"] = "Feria editada"
+        json_store.invalidate_cache()
+        self.assertEqual(json_store.buscar("solicitudes", solicitud["id"])["nombre"], "anidada")
+        self.assertEqual(json_store.get_data()["ferias"][0]["nombre"], "Feria editada")
+
+    def test_helpers_anidados_se_descartan_con_la_externa(self):
+        with self.assertRaises(RuntimeError):
+            with json_store.transaction():
+                solicitud = self._solicitud("descartada")
+                raise RuntimeError
+        self.assertIsNone(json_store.buscar("solicitudes", solicitud["id"]))
+        json_store.invalidate_cache()
+        self.assertEqual(json_store.get_data()["solicitudes"], [])
+
+
+class FotosProductoTests(TestCase):
+    def setUp(self):
+        self._media = tempfile.mkdtemp()
+        ajuste = override_settings(MEDIA_ROOT=self._media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.addCleanup(shutil.rmtree, self._media, True)
+
+        self.user = CustomUser.objects.create_user(
+            username="artesano", email="artesano@example.com", password="x", role="artesano",
+        )
+        Artesano.objects.create(usuario=self.user, nombre="Artesano")
+        self.client.force_login(self.user)
+
+    def _foto(self, color="red"):
+        buf = io.BytesIO()
+        Image.new("RGB", (400, 300), color).save(buf, "PNG")
+        return SimpleUploadedFile("foto.png", buf.getvalue(), content_type="image/png")
+
+    def _archivos(self):
+        carpeta = os.path.join(self._media, imagenes.CARPETA)
+        return sorted(os.listdir(carpeta)) if os.path.isdir(carpeta) else []
+
+    def _post(self):
+        return self.client.post(reverse("editar_perfil_artesano"), {
+            "nombre": "Artesano", "descripcion": "",
+            "form-TOTAL_FORMS": "0", "form-INITIAL_FORMS": "0",
+            "form-MIN_NUM_FORMS": "0", "form-MAX_NUM_FORMS": "1000",
+            "nuevo_producto_nombre": "Jarrón", "nuevo_producto_desc": "",
+            "nuevo_producto_imagen": self._foto(),
+        })
+
+    def test_se_sirven_con_cache_immutable(self):
+        self._post()
+        producto = Producto.objects.get()
+        respuesta = self.client.get(producto.imagen_src)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn("immutable", respuesta["Cache-Control"])
+        self.assertIn("max-age=31536000", respuesta["Cache-Control"])
+        self.assertEqual(self.client.get(producto.imagen_src.replace("-320.", "-999.")).status_code, 404)
+
+    def test_guardado_fallido_no_deja_archivos(self):
+        with mock.patch.object(Producto.objects, "bulk_create", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self._post()
+        self.assertFalse(Producto.objects.exists())
+        self.assertEqual(self._archivos(), [])
+
+
+class BandejaDeSalidaTests(TestCase):
+    """El reset de contraseña encola el correo; lo manda `enviar_correos` (en los tests, backend locmem)."""
+
+    def setUp(self):
+        CustomUser.objects.create_user(username="ana", email="ana@example.com", password="x")
+
+    def _enviar(self):
+        call_command("enviar_correos", stdout=io.StringIO())
+
+    def test_reset_encola_y_el_comando_lo_manda(self):
+        respuesta = self.client.post(reverse("password_reset"), {"email": "ana@example.com"})
+        self.assertRedirects(respuesta, reverse("password_reset_done"), fetch_redirect_response=False)
+        correo = CorreoPendiente.objects.get()
+        self.assertEqual(correo.para, ["ana@example.com"])
+        self.assertEqual(mail.outbox, [])  # nada se manda dentro del request
+
+        self._enviar()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["ana@example.com"])
+        self.assertEqual(mail.outbox[0].subject, correo.asunto)
+        correo.refresh_from_db()
+        self.assertIsNotNone(correo.enviado)
+
+        self._enviar()  # ya enviado: no se repite
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_conexion_fallida_suma_intento_y_reprograma(self):
+        correo = correos.encolar("Asunto", "Cuerpo", ["ana@example.com"])
+        with mock.patch.object(correos, "get_connection", side_effect=ConnectionRefusedError("sin servidor")):
+            with self.assertLogs("main.correos", "WARNING"):
+                self._enviar()
+        correo.refresh_from_db()
+        self.assertEqual(correo.intentos, 1)
+        self.assertIn("sin servidor", correo.error)
+        self.assertIsNone(correo.enviado)
+        self.assertGreater(correo.proximo_intento, timezone.now())
+        self.assertEqual(mail.outbox, [])
+
+        self._enviar()  # todavía no le toca
+        self.assertEqual(mail.outbox, [])
+
+        CorreoPendiente.objects.filter(pk=correo.pk).update(proximo_intento=timezone.now())
+        self._enviar()
+        self.assertEqual(len(mail.outbox), 1)
+        correo.refresh_from_db()
+        self.assertIsNotNone(correo.enviado)
+        self.assertEqual(correo.error, "")
+
+
+class ModeracionMixin:
+    """
+    moderar_solicitudes con un lote que se pasa del cupo de un tipo: se atiende por
+    (feria, tipo, antigüedad), sin importar el orden de los ids, en los dos backends.
+    """
+    store = None
+
+    def _envejecer(self, solicitud_id):
+        raise NotImplementedError
+
+    def setUp(self):
+        super().setUp()
+        feria = {
+            "nombre": "Feria", "fecha_inicio": "2030-01-01", "fecha_fin": "2030-01-02",
+            "tipos_productos": [{"tipo": "Cerámica", "cupos": 2}, {"tipo": "Textil", "cupos": 5}],
+        }
+        self.store.add_feria(feria)
+        self.feria_id = feria["id"]
+        self.c1, self.t1, self.c2, self.c3 = (
+            self.store.add_solicitud({"usuario": "u", "nombre": nombre, "descripcion": "",
+                                      "feria_id": self.feria_id, "tipo": tipo})["id"]
+            for nombre, tipo in (("c1", "Cerámica"), ("t1", "Textil"), ("c2", "Cerámica"), ("c3", "Cerámica"))
+        )
+
+    def test_cupo_desbordado(self):
+        self._envejecer(self.c3)  # la más antigua de Cerámica, aunque tenga el id más alto
+        informe = self.store.moderar_solicitudes([self.c2, 999999, self.t1, self.c3, self.c1], "aprobar")
+
+        self.assertEqual(informe, [
+            {"id": 999999, "ok": False, "mensaje": "Solicitud no encontrada"},
+            {"id": self.c3, "ok": True, "mensaje": "Aprobada"},
+            {"id": self.c1, "ok": True, "mensaje": "Aprobada"},
+            {"id": self.c2, "ok": False, "mensaje": "¡Máximo de artesanos alcanzado para esta categoría!"},
+            {"id": self.t1, "ok": True, "mensaje": "Aprobada"},
+        ])
+        self.assertEqual(sorted(a["nombre"] for a in self.store.artesanos()), ["c1", "c3", "t1"])
+        self.assertEqual(self.store.buscar("solicitudes", self.c2)["estado"], "pendiente")
+
+    def test_rechazar_no_toca_las_aceptadas(self):
+        self.store.moderar_solicitudes([self.c1], "aprobar")
+        informe = self.store.moderar_solicitudes([self.c1, self.c2], "rechazar")
+        self.assertEqual(informe, [
+            {"id": self.c1, "ok": False, "mensaje": "Ya estaba aceptada"},
+            {"id": self.c2, "ok": True, "mensaje": "Rechazada"},
+        ])
+        self.assertEqual(self.store.buscar("solicitudes", self.c1)["estado"], "aceptado")
+
+
+class ModeracionJsonTests(ModeracionMixin, DocumentoTemporalTestCase):
+    store = json_store
+
+    def _envejecer(self, solicitud_id):
+        with json_store.transaction():
+            json_store.buscar("solicitudes", solicitud_id)["creado"] = "2000-01-01T00:00:00+00:00"
+
+
+class ModeracionDbTests(ModeracionMixin, TestCase):
+    store = db_store
+
+    def _envejecer(self, solicitud_id):
+        SolicitudFeria.objects.filter(pk=solicitud_id).update(created_at=timezone.now() - timezone.timedelta(days=365))
+
+
+class ClaveCachePublicaTests(DocumentoTemporalTestCase):
+    """Parámetros que la página no usa no crean otra copia en caché (ni otro ETag)."""
+
+    def test_querystring_ajeno_no_cambia_la_clave(self):
+        with mock.patch.object(views, "cache", wraps=views.cache) as cache:
+            etags = {self.client.get("/public/", {"x": n})["ETag"] for n in range(3)}
+            etags.add(self.client.get("/public/")["ETag"])
+        self.assertEqual(len(etags), 1)
+        self.assertEqual(len({c.args[0] for c in cache.set.call_args_list if c.args[0].startswith("public:")}), 1)
+
+    def test_api_solo_sus_parametros(self):
+        url = reverse("api_ferias")
+        base = self.client.get(url, {"page": 1})["ETag"]
+        self.assertEqual(self.client.get(url, {"x": 1})["ETag"], base)
+        self.assertEqual(self.client.get(url, {"page": "abc"})["ETag"], base)
+        self.assertNotEqual(self.client.get(url, {"fields": "id"})["ETag"], base)
@@ -8,6 +8,12 @@ urlpatterns = [
     path('', views.public_view, name='home'), 
     path('public/', views.public_view, name='public_view'),
 
+    # --- API (JSON, solo lectura) ---
+    path('api/ferias/', views.api_ferias, name='api_ferias'),
+    path('api/ferias/<int:feria_id>/', views.api_feria, name='api_feria'),
+    path('api/ferias/<int:feria_id>/artesanos/', views.api_feria_artesanos, name='api_feria_artesanos'),
+    path('api/artesanos/', views.api_artesanos, name='api_artesanos'),
+
     # --- Autenticación ---
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
@@ -17,17 +23,21 @@ urlpatterns = [
     path('panel/', views.user_panel, name='user_panel'),
     path('panel/artesano/', views.artesano_panel, name='artesano_panel'),   # 👈 faltaba
     path('panel/admin/', views.admin_panel, name='admin_panel'),
+    path('panel/solicitudes/', views.mis_solicitudes_view, name='mis_solicitudes'),
 
     # --- Gestión de Artesanos ---
     path("panel/admin/delete-artesano/<int:artesano_id>/", views.delete_artesano_view, name="delete_artesano"),
     path("panel/admin/edit-artesano/<int:artesano_id>/", views.edit_artesano_view, name="edit_artesano"),
     path("panel/admin/editar-artesano/<int:artesano_id>/", views.edit_artesano_view, name="editar_artesano"),  # 👈 para tu template
 
+    # --- Moderación de solicitudes en lote ---
+    path("panel/admin/solicitudes/moderar/", views.moderar_solicitudes_view, name="moderar_solicitudes"),
+
     # --- Gestión de Ferias ---
     path("panel/admin/editar-feria/<int:feria_id>/", views.editar_feria, name="editar_feria"),
     path("panel/admin/usuarios/<int:user_id>/editar/", views.edit_user_view, name="edit_user"),
     path('password-reset/',
-         auth_views.PasswordResetView.as_view(
+         views.CustomPasswordResetView.as_view(
              template_name='auth/password_reset.html',
              email_template_name='auth/password_reset_email.txt',
              subject_template_name='auth/password_reset_subject.txt',
@@ -1,255 +1,169 @@
 # main/utils.py
-import json, os
-
-DATA_FILE = os.path.join(os.path.dirname(__file__), "data/ferias.json")
-
-
-# -------------------- IO --------------------
-
-def _ensure_file():
-    """Crea el JSON si no existe, con llaves base."""
-    if not os.path.exists(DATA_FILE):
-        os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump({"ferias": [], "artesanos": [], "solicitudes": []}, f, indent=4, ensure_ascii=False)
-
-
-def load_data():
-    _ensure_file()
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    # llaves seguras
-    data.setdefault("ferias", [])
-    data.setdefault("artesanos", [])
-    data.setdefault("solicitudes", [])
-    return data
-
-
-def save_data(data):
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-
-# -------------------- Ferias --------------------
-
-def add_feria(feria):
-    data = load_data()
-
-    # Generar ID único
-    next_id = max((f.get("id", 0) for f in data["ferias"]), default=0) + 1
-    feria["id"] = next_id
-
-    # Sanitizar nombre
-    feria["nombre"] = (feria.get("nombre") or "").strip()
-
-    # Asegurar estructura de tipos
-    tipos = feria.get("tipos_productos", []) or []
-    for tp in tipos:
-        tp["tipo"] = (tp.get("tipo") or "").strip()
-        tp["cupos"] = int(tp.get("cupos") or 0)
-
-    feria["tipos_productos"] = tipos
-    feria["cupos_totales"] = sum(tp.get("cupos", 0) for tp in tipos)
-    feria["ocupados"] = 0
-
-    data["ferias"].append(feria)
-    save_data(data)
-
-
-def delete_feria(feria_id):
-    data = load_data()
-    feria_id = int(feria_id)
-
-    # eliminar feria
-    data["ferias"] = [f for f in data["ferias"] if int(f.get("id")) != feria_id]
-
-    # eliminar artesanos y solicitudes asociadas
-    data["artesanos"] = [a for a in data["artesanos"] if int(a.get("feria_id", -1)) != feria_id]
-    data["solicitudes"] = [s for s in data["solicitudes"] if int(s.get("feria_id", -1)) != feria_id]
-
-    save_data(data)
-
-
-def edit_feria(feria_id, new_data):
-    data = load_data()
-    feria_id = int(feria_id)
-
-    for f in data["ferias"]:
-        if int(f.get("id")) == feria_id:
-            f.update(new_data or {})
-            # Normalizar tipos si vinieron
-            if "tipos_productos" in (new_data or {}):
-                tipos = f.get("tipos_productos", []) or []
-                for tp in tipos:
-                    tp["tipo"] = (tp.get("tipo") or "").strip()
-                    tp["cupos"] = int(tp.get("cupos") or 0)
-                f["tipos_productos"] = tipos
-                f["cupos_totales"] = sum(tp.get("cupos", 0) for tp in tipos)
-            break
-
-    save_data(data)
-
-
-# -------------------- Artesanos (aprobados) --------------------
-
-def _cupos_disponibles_para_tipo(feria, tipo):
-    """Devuelve (ocupados_tipo, cupos_tipo) para la feria y tipo dados."""
-    data = load_data()
-    cupos_tipo = 0
-    for tp in feria.get("tipos_productos", []):
-        if tp.get("tipo") == tipo:
-            cupos_tipo = int(tp.get("cupos") or 0)
-            break
-    ocupados_tipo = sum(
-        1 for a in data["artesanos"]
-        if int(a.get("feria_id")) == int(feria["id"]) and a.get("tipo") == tipo
-    )
-    return ocupados_tipo, cupos_tipo
-
-
-def add_artesano(artesano):
+"""
+API de ferias, artesanos y solicitudes para vistas, formularios y comandos.
+
+Las funciones de datos son las del backend activo (settings.FERIAS_BACKEND):
+json_store (ferias.json, por defecto) o db_store (tablas indexadas). Aquí quedan
+además los helpers que sirven para los dos.
+"""
+import threading
+
+from django.conf import settings
+
+from . import json_store
+from .json_store import Ocupacion, _resumir  # noqa: F401  (db_store usa Ocupacion)
+
+BACKEND = getattr(settings, "FERIAS_BACKEND", "json")
+
+if BACKEND == "db":
+    from . import db_store as backend
+else:
+    backend = json_store
+
+# -------------------- API del backend activo --------------------
+
+get_data = backend.get_data
+ferias = backend.ferias
+artesanos = backend.artesanos
+invalidate_cache = backend.invalidate_cache
+version_datos = backend.version_datos
+ocupacion = backend.ocupacion
+buscar = backend.buscar
+reconstruir_resumenes = backend.reconstruir_resumenes
+archivar = backend.archivar
+solicitudes_de = backend.solicitudes_de
+
+add_feria = backend.add_feria
+delete_feria = backend.delete_feria
+edit_feria = backend.edit_feria
+FERIA_ID_FIELD = backend.FERIA_ID_FIELD
+sync_ferias_db = backend.sync_ferias_db
+
+add_artesano = backend.add_artesano
+delete_artesano = backend.delete_artesano
+edit_artesano = backend.edit_artesano
+
+add_solicitud = backend.add_solicitud
+set_estado_solicitud = backend.set_estado_solicitud
+aprobar_solicitud = backend.aprobar_solicitud
+aprobar_solicitudes = backend.aprobar_solicitudes
+moderar_solicitudes = backend.moderar_solicitudes
+rechazar_solicitud = backend.rechazar_solicitud
+delete_solicitudes_usuario = backend.delete_solicitudes_usuario
+
+ferias_tipos_map = backend.ferias_tipos_map
+listar_artesanos = backend.listar_artesanos
+listar_solicitudes = backend.listar_solicitudes
+buscar_texto = backend.buscar_texto
+
+
+# -------------------- Favoritos --------------------
+
+def favoritas_ids(user):
     """
-    Se usa al APROBAR una solicitud.
-    Valida cupos por tipo según la feria (no un tope fijo).
+    Set con los ids (del documento) de las ferias favoritas del usuario.
+    Una sola consulta por request: queda guardado en el objeto user.
     """
-    data = load_data()
-
-    feria = next((f for f in data["ferias"] if int(f.get("id")) == int(artesano["feria_id"])), None)
-    if not feria:
-        raise ValueError("Feria no encontrada")
-
-    tipo = artesano.get("tipo")
-    # verificar que el tipo exista en la feria
-    if not any(tp.get("tipo") == tipo for tp in feria.get("tipos_productos", [])):
-        raise ValueError("Tipo no disponible en esta feria")
-
-    ocupados_tipo, cupos_tipo = _cupos_disponibles_para_tipo(feria, tipo)
-    if cupos_tipo == 0 or ocupados_tipo >= cupos_tipo:
-        raise ValueError("¡Máximo de artesanos alcanzado para esta categoría!")
-
-    # Asignar ID incremental real
-    next_id = max((a.get("id", 0) for a in data["artesanos"]), default=0) + 1
-    nuevo = {
-        "id": next_id,
-        "nombre": artesano.get("nombre", "").strip(),
-        "tipo": tipo,
-        "descripcion": artesano.get("descripcion", "").strip(),
-        "feria_id": int(artesano["feria_id"]),
-    }
-    data["artesanos"].append(nuevo)
-
-    # Recalcular ocupados de la feria
-    feria["ocupados"] = sum(1 for a in data["artesanos"] if int(a.get("feria_id")) == int(feria["id"]))
-
-    save_data(data)
-
-
-def delete_artesano(artesano_id):
-    data = load_data()
-    artesano_id = int(artesano_id)
-
-    data["artesanos"] = [a for a in data["artesanos"] if int(a.get("id")) != artesano_id]
-
-    # actualizar ocupados por feria
-    for feria in data["ferias"]:
-        feria["ocupados"] = sum(1 for a in data["artesanos"] if int(a.get("feria_id")) == int(feria["id"]))
-
-    save_data(data)
-
-
-def edit_artesano(artesano_id, new_data):
-    data = load_data()
-    artesano_id = int(artesano_id)
-
-    for a in data["artesanos"]:
-        if int(a.get("id")) == artesano_id:
-            a.update(new_data or {})
-            break
+    ids = getattr(user, "_favoritas_ids", None)
+    if ids is None:
+        ids = set(user.ferias_favoritas.values_list(FERIA_ID_FIELD, flat=True))
+        user._favoritas_ids = ids
+    return ids
 
-    # actualizar ocupados por feria
-    for feria in data["ferias"]:
-        feria["ocupados"] = sum(1 for a in data["artesanos"] if int(a.get("feria_id")) == int(feria["id"]))
 
-    save_data(data)
+def toggle_favorita(user, feria_id):
+    """
+    Marca/desmarca una feria como favorita con un solo DELETE o INSERT sobre la
+    tabla intermedia. Devuelve True si quedó marcada, False si se quitó y
+    None si la feria no existe.
+    """
+    from .models import CustomUser, Feria
+
+    Favorita = CustomUser.ferias_favoritas.through
+    fila = Feria.objects.filter(**{FERIA_ID_FIELD: int(feria_id)})
+    feria_pk = fila.values_list("pk", flat=True).first()
+    if feria_pk is None:
+        # feria del JSON todavía sin fila (base nueva sin `sincronizar_ferias`): se crea ahora
+        feria = buscar("ferias", feria_id)
+        if feria is None:
+            return None
+        sync_ferias_db([feria])
+        feria_pk = fila.values_list("pk", flat=True).first()
+
+    borradas, _ = Favorita.objects.filter(customuser_id=user.pk, feria_id=feria_pk).delete()
+    if not borradas:
+        Favorita.objects.bulk_create([Favorita(customuser_id=user.pk, feria_id=feria_pk)], ignore_conflicts=True)
+
+    ids = getattr(user, "_favoritas_ids", None)
+    if ids is not None:
+        (ids.discard if borradas else ids.add)(int(feria_id))
+    return not borradas
+
+
+def conteo_favoritas():
+    """{feria_id (del documento): cuántos usuarios la tienen de favorita}, en un solo GROUP BY."""
+    from django.db.models import Count
+    from .models import CustomUser
+
+    Favorita = CustomUser.ferias_favoritas.through
+    filas = (
+        Favorita.objects.values_list(f"feria__{FERIA_ID_FIELD}")
+        .annotate(n=Count("id")).order_by()
+    )
+    return {feria_id: n for feria_id, n in filas if feria_id is not None}
 
 
-# -------------------- Solicitudes --------------------
+# -------------------- Utilidades para vistas --------------------
 
-def add_solicitud(solicitud):
+def feria_detalle(f, oc=None):
     """
-    Crea una solicitud con estado='pendiente'.
-    Estructura mínima:
-    {
-        "usuario": "...",
-        "nombre": "...",
-        "descripcion": "...",
-        "feria_id": 1,
-        "tipo": "cerámica"
-    }
+    Feria lista para mostrar:
+    {id, nombre, fecha_inicio, fecha_fin, preferencias, ocupados, total_cupos, tipos: [{tipo, cupos, ocupados}]}.
+    Los números salen del resumen guardado en la feria; si no lo tiene (documento
+    anterior a los resúmenes) se calcula con el índice de ocupación.
     """
-    data = load_data()
-    next_id = max((s.get("id", 0) for s in data["solicitudes"]), default=0) + 1
-    solicitud_out = {
-        "id": next_id,
-        "usuario": solicitud.get("usuario", ""),
-        "nombre": solicitud.get("nombre", "").strip(),
-        "descripcion": solicitud.get("descripcion", "").strip(),
-        "feria_id": int(solicitud.get("feria_id")),
-        "tipo": solicitud.get("tipo"),
-        "estado": "pendiente",
+    resumen = f.get("resumen") or _resumir(f, oc or ocupacion())
+    fid = f.get("id")
+    return {
+        "id": fid,
+        "nombre": f.get("nombre", f"Feria {fid}"),
+        "fecha_inicio": f.get("fecha_inicio", ""),
+        "fecha_fin": f.get("fecha_fin", ""),
+        "preferencias": f.get("preferencias", ""),
+        "ocupados": resumen["ocupados"],
+        "total_cupos": resumen["total_cupos"],
+        "tipos": [dict(tp) for tp in resumen["tipos"]],
     }
-    data["solicitudes"].append(solicitud_out)
-    save_data(data)
-    return solicitud_out
-
-
-def set_estado_solicitud(solicitud_id, estado):
-    data = load_data()
-    solicitud_id = int(solicitud_id)
-    for s in data["solicitudes"]:
-        if int(s.get("id")) == solicitud_id:
-            s["estado"] = estado
-            break
-    save_data(data)
 
 
-def aprobar_solicitud(solicitud_id):
-    """Aprueba (valida cupos y agrega a artesanos); setea estado='aceptado'."""
-    data = load_data()
-    s = next((x for x in data["solicitudes"] if int(x.get("id")) == int(solicitud_id)), None)
-    if not s:
-        raise ValueError("Solicitud no encontrada")
+_opciones = {"version": None, "valor": None}
+_opciones_lock = threading.Lock()
 
-    if s.get("estado") == "aceptado":
-        return  # ya estaba aceptada
-
-    # Intentar agregar como artesano (puede lanzar ValueError si no hay cupos)
-    add_artesano({
-        "nombre": s["nombre"],
-        "tipo": s["tipo"],
-        "descripcion": s["descripcion"],
-        "feria_id": s["feria_id"],
-    })
-
-    s["estado"] = "aceptado"
-    save_data(data)
-
-
-def rechazar_solicitud(solicitud_id):
-    set_estado_solicitud(solicitud_id, "rechazado")
-
-
-# -------------------- Utilidades para vistas --------------------
 
-def ferias_tipos_map():
+def opciones_ferias():
     """
-    Devuelve { "feria_id_str": ["tipo1","tipo2", ...], ... }
-    Útil para poblar el <select> de tipos en el panel del artesano vía JS.
+    Choices de los formularios, armados una vez por versión de datos:
+      "ferias":      [(id, nombre)]                       -> SolicitudFeriaForm
+      "disponibles": [(id, "nombre - inicio al fin")]     -> ArtesanoForm (solo con cupos libres)
+      "tipos":       {feria_id: [(tipo, tipo)]}           -> tipo de la feria elegida
     """
-    data = load_data()
-    mapa = {}
-    for f in data["ferias"]:
-        fid = str(f.get("id"))
-        mapa[fid] = [tp.get("tipo") for tp in f.get("tipos_productos", [])]
-    return mapa
+    version, _ = version_datos()
+    with _opciones_lock:
+        if _opciones["version"] == version:
+            return _opciones["valor"]
+
+    valor = {"ferias": [], "disponibles": [], "tipos": {}}
+    for f in ferias():
+        fid = int(f["id"])
+        nombre = f.get("nombre", f"Feria {fid}")
+        valor["ferias"].append((fid, nombre))
+        valor["tipos"][fid] = [(tp["tipo"], tp["tipo"]) for tp in f.get("tipos_productos", [])]
+        detalle = feria_detalle(f)
+        if detalle["ocupados"] < detalle["total_cupos"]:
+            valor["disponibles"].append(
+                (fid, f"{nombre} - {f.get('fecha_inicio', '')} al {f.get('fecha_fin', '')}")
+            )
+
+    with _opciones_lock:
+        _opciones["version"], _opciones["valor"] = version, valor
+    return valor
@@ -2,12 +2,17 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from .models import CustomUser
-from . import utils
-from django.http import HttpResponseRedirect
+from . import archivo, utils
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+import hashlib
 from django.urls import reverse
-from .utils import load_data, save_data
 from django.contrib import messages
 from django.forms import formset_factory
+from django.core.paginator import Paginator
+from django.db.models import Q
 from .forms import SolicitudFeriaForm
 import json
 from django.contrib.auth import get_user_model
@@ -17,7 +22,6 @@ User = get_user_model()
 from django.contrib.auth.views import PasswordResetView
 from .forms import CustomPasswordResetForm
 from django.shortcuts import render
-from .models import Feria
 
 class CustomPasswordResetView(PasswordResetView):
     form_class = CustomPasswordResetForm
@@ -96,71 +100,18 @@ from .forms import SolicitudFeriaForm  # Asegúrate de que este formulario esté
 
 @login_required
 def user_panel(request):
-    data = utils.load_data()
-    ferias_json = data.get("ferias", [])
-    artesanos = data.get("artesanos", [])
-    solicitudes = data.get("solicitudes", [])
-
-   
-
-    # --- Sincroniza ferias del modelo con el JSON (solo nombre y fechas) ---
-    ferias_db_map = {}
-    for f in ferias_json:
-        feria_obj, _ = Feria.objects.get_or_create(
-            nombre=f.get("nombre", f"Feria {f.get('id')}"),
-            defaults={
-                "fecha_inicio": f.get("fecha_inicio") or "2000-01-01",
-                "fecha_fin": f.get("fecha_fin") or "2000-01-01",
-                "preferencias": f.get("preferencias", ""),
-                "ocupados": f.get("ocupados", 0),
-            }
-        )
-        ferias_db_map[f["id"]] = feria_obj
+    ferias_json = utils.ferias()
 
-    # --- Favoritos ---
+    # --- Favoritos (las filas Feria se sincronizan al crear/editar ferias) ---
     if request.method == "POST" and "fav_feria_id" in request.POST:
-        feria_json_id = int(request.POST.get("fav_feria_id"))
-        feria_obj = ferias_db_map.get(feria_json_id)
-        if feria_obj:
-            if feria_obj in request.user.ferias_favoritas.all():
-                request.user.ferias_favoritas.remove(feria_obj)
-            else:
-                request.user.ferias_favoritas.add(feria_obj)
+        utils.toggle_favorita(request.user, request.POST.get("fav_feria_id"))
         return redirect('user_panel')
 
-    favoritas = request.user.ferias_favoritas.all()
-    favoritas_ids = list(favoritas.values_list('id', flat=True))
+    # una sola consulta: ids (del documento) de las ferias favoritas
+    favoritas_ids = utils.favoritas_ids(request.user)
 
     # ====== construir ferias (con cupos y tipos) ======
-    ferias_detalles = []
-    for f in ferias_json:
-        total_cupos = sum(tp.get("cupos", 0) for tp in f.get("tipos_productos", []))
-        if not total_cupos:
-            total_cupos = f.get("cupos_totales") or 0
-
-        ocupados = sum(1 for a in artesanos if a.get("feria_id") == f.get("id"))
-
-        tipos_info = []
-        for tp in f.get("tipos_productos", []):
-            ocupados_tipo = sum(
-                1 for a in artesanos
-                if a.get("feria_id") == f.get("id") and a.get("tipo") == tp.get("tipo")
-            )
-            tipos_info.append({
-                "tipo": tp.get("tipo"),
-                "cupos": tp.get("cupos", 0),
-                "ocupados": ocupados_tipo,
-            })
-
-        ferias_detalles.append({
-            "id": f.get("id"),
-            "nombre": f.get("nombre", f"Feria {f.get('id')}"),
-            "fecha_inicio": f.get("fecha_inicio", ""),
-            "fecha_fin": f.get("fecha_fin", ""),
-            "total_cupos": total_cupos,
-            "ocupados": ocupados,
-            "tipos": tipos_info,
-        })
+    ferias_detalles = [utils.feria_detalle(f) for f in ferias_json]
 
     ferias_tipos = {
         str(f["id"]): f["tipos"]
@@ -169,44 +120,33 @@ def user_panel(request):
 
     form = SolicitudFeriaForm()
 
-    artesanos_por_feria = {}
-    for a in artesanos:
-        fid = a.get("feria_id")
-        artesanos_por_feria.setdefault(fid, []).append(a)
-        
     return render(request, "usuario_registrado/user_panel.html", {
         "form": form,
-        "solicitudes": [s for s in solicitudes if s.get("usuario") == request.user.username],
         "ferias": ferias_detalles,
         "ferias_tipos_json": json.dumps(ferias_tipos),
-        "favoritas": favoritas,
-        "favoritas_ids": list(ferias_db_map[k].id for k in ferias_db_map if ferias_db_map[k] in favoritas),
-        "artesanos": artesanos,  # <-- Agrega esta línea
-        "artesanos_por_feria": artesanos_por_feria, 
+        "favoritas": [f for f in ferias_detalles if f["id"] in favoritas_ids],
+        "favoritas_ids": favoritas_ids,
     })
 
 
 
 
 
+# solicitudes que se muestran en el panel del artesano (el resto, en mis_solicitudes)
+PANEL_SOLICITUDES = 5
+
+
 @login_required
 def artesano_panel(request):
     if request.user.role != 'artesano':
         return redirect('user_panel' if request.user.role == 'user' else 'admin_panel')
 
-    data = utils.load_data()
-    ferias = data.get("ferias", [])
-    artesanos = data.get("artesanos", [])
-    solicitudes = data.get("solicitudes", [])
-
-    # 👇 siempre define el form en GET
-    form = SolicitudFeriaForm()
-
     if request.method == "POST":
         form = SolicitudFeriaForm(request.POST)
         if form.is_valid():
             utils.add_solicitud({
                 "usuario": request.user.username,
+                "user_id": request.user.pk,
                 "nombre": form.cleaned_data["nombre"],
                 "descripcion": form.cleaned_data["descripcion"],
                 "feria_id": int(form.cleaned_data["feria_id"]),
@@ -214,42 +154,25 @@ def artesano_panel(request):
             })
             messages.success(request, "Solicitud enviada. Espera la aprobación del administrador.")
             return redirect("artesano_panel")
+    else:
+        form = SolicitudFeriaForm()
 
     # ---- construir ferias con cupos para mostrar en selects ----
-    ferias_detalles = []
-    for f in ferias:
-        total_cupos = sum(tp.get("cupos", 0) for tp in f.get("tipos_productos", [])) or f.get("cupos_totales", 0)
-        ocupados = sum(1 for a in artesanos if a.get("feria_id") == f.get("id"))
-        tipos_info = []
-        for tp in f.get("tipos_productos", []):
-            ocupados_tipo = sum(1 for a in artesanos if a.get("feria_id") == f.get("id") and a.get("tipo") == tp.get("tipo"))
-            tipos_info.append({"tipo": tp.get("tipo"), "cupos": tp.get("cupos", 0), "ocupados": ocupados_tipo})
-        ferias_detalles.append({
-            "id": f.get("id"),
-            "nombre": f.get("nombre", f"Feria {f.get('id')}"),
-            "fecha_inicio": f.get("fecha_inicio", ""),
-            "fecha_fin": f.get("fecha_fin", ""),
-            "total_cupos": total_cupos,
-            "ocupados": ocupados,
-            "tipos": tipos_info,
-        })
+    ferias_detalles = [utils.feria_detalle(f) for f in utils.ferias()]
 
     # mapa feria -> tipos (para llenar el combo con ocupados/cupos)
     ferias_tipos = {str(f["id"]): f["tipos"] for f in ferias_detalles}
 
-    mis_solicitudes = [s for s in solicitudes if s.get("usuario") == request.user.username]
+    mis_solicitudes = utils.solicitudes_de(request.user.username, request.user.pk)
 
-    # Obtener perfil y productos actuales del artesano
-    try:
-        artesano_obj = Artesano.objects.get(usuario=request.user)
-        productos = list(Producto.objects.filter(artesano=artesano_obj))
-    except Artesano.DoesNotExist:
-        artesano_obj = None
-        productos = []
+    # Perfil y productos actuales del artesano (2 consultas, tenga los productos que tenga)
+    artesano_obj = Artesano.objects.filter(usuario=request.user).prefetch_related("productos").first()
+    productos = list(artesano_obj.productos.all()) if artesano_obj else []
 
     return render(request, "usuario_registrado/artesano_panel.html", {
         "form": form,
-        "solicitudes": mis_solicitudes,
+        "solicitudes": mis_solicitudes[::-1][:PANEL_SOLICITUDES],
+        "total_solicitudes": len(mis_solicitudes),
         "ferias": ferias_detalles,
         "ferias_tipos_json": json.dumps(ferias_tipos),
         "perfil_artesano": artesano_obj,
@@ -258,6 +181,33 @@ def artesano_panel(request):
 
 # =================== Panel del Admin ===================
 
+@login_required
+def mis_solicitudes_view(request):
+    """Historial de solicitudes del usuario, paginado y filtrable por ?estado=."""
+    estado = request.GET.get("estado", "")
+    solicitudes = utils.solicitudes_de(request.user.username, request.user.pk)
+    if estado:
+        solicitudes = [s for s in solicitudes if s.get("estado") == estado]
+    page_obj = _paginar(request, solicitudes[::-1])  # las más nuevas primero
+    # copias: los registros del documento cacheado no se tocan
+    nombres = {int(f["id"]): f.get("nombre") for f in utils.ferias()}  # una lectura, no una por fila
+    filas = []
+    for s in page_obj.object_list:
+        nombre = nombres.get(int(s.get("feria_id") or 0))
+        filas.append(dict(s, feria_nombre=nombre or f"Feria {s.get('feria_id')}"))
+    page_obj.object_list = filas
+
+    querystring = request.GET.copy()
+    querystring.pop("page", None)
+    return render(request, "usuario_registrado/mis_solicitudes.html", {
+        "page_obj": page_obj,
+        "estado": estado,
+        "estados": ("pendiente", "aceptado", "rechazado"),
+        "querystring": querystring.urlencode(),
+        "panel_url": "artesano_panel" if request.user.role == "artesano" else "user_panel",
+    })
+
+
 @login_required
 def admin_panel(request):
     if request.user.role != 'admin':
@@ -296,9 +246,7 @@ def admin_panel(request):
         # --- APROBAR SOLICITUD ---
         elif "aprobar_solicitud" in request.POST:
             sid = int(request.POST.get("aprobar_solicitud"))
-            data = utils.load_data()
-            solicitudes = data.get("solicitudes", [])
-            s = next((x for x in solicitudes if x["id"] == sid), None)
+            s = utils.buscar("solicitudes", sid)
             if not s:
                 messages.error(request, "La solicitud no existe.")
                 return redirect("admin_panel")
@@ -307,16 +255,9 @@ def admin_panel(request):
                 messages.info(request, "La solicitud ya estaba aceptada.")
                 return redirect("admin_panel")
 
-            # Validar cupos usando tu helper existente
+            # Validar cupos y agregar el artesano en una sola transacción
             try:
-                utils.add_artesano({
-                    "nombre": s["nombre"],
-                    "tipo": s["tipo"],
-                    "descripcion": s["descripcion"],
-                    "feria_id": s["feria_id"],
-                })
-                s["estado"] = "aceptado"
-                utils.save_data(data)
+                utils.aprobar_solicitud(sid)
                 messages.success(request, "Solicitud aprobada y artesano agregado a la feria.")
             except ValueError:
                 messages.error(request, "No hay cupos disponibles para esa categoría.")
@@ -325,13 +266,7 @@ def admin_panel(request):
         # --- RECHAZAR SOLICITUD ---
         elif "rechazar_solicitud" in request.POST:
             sid = int(request.POST.get("rechazar_solicitud"))
-            data = utils.load_data()
-            solicitudes = data.get("solicitudes", [])
-            for x in solicitudes:
-                if x["id"] == sid:
-                    x["estado"] = "rechazado"
-                    break
-            utils.save_data(data)
+            utils.rechazar_solicitud(sid)
             messages.info(request, "Solicitud rechazada.")
             return redirect("admin_panel")
         # --- ELIMINAR USUARIO ---
@@ -351,12 +286,7 @@ def admin_panel(request):
             target.delete()
 
             # Limpia sus solicitudes del JSON (por user_id o, si hay viejas, por username)
-            data = utils.load_data()
-            data["solicitudes"] = [
-                s for s in data.get("solicitudes", [])
-                if s.get("user_id") != uid and s.get("usuario") != username
-            ]
-            utils.save_data(data)
+            utils.delete_solicitudes_usuario(uid, username)
 
             messages.success(request, "Usuario eliminado.")
             return redirect("admin_panel")
@@ -381,80 +311,167 @@ def admin_panel(request):
                 })
             return redirect("admin_panel")
     
-    # --------- GET: construir contexto ---------
-    data = utils.load_data()
-    users = User.objects.all().order_by("-date_joined")
-    ferias = data.get("ferias", [])
-    artesanos = data.get("artesanos", [])
-    solicitudes = data.get("solicitudes", [])
-
-    # Formularios
-    feria_form = FeriaForm()
-    artesano_form = ArtesanoForm()  # legacy (lo dejamos visible si quieres mantenerlo)
-    tipo_formset = TipoProductoFormSet(prefix="tipos")
-
-    # Ferias con detalles (recalcular ocupados)
-    ferias_detalles = []
-    ferias_disponibles = []
-    for f in ferias:
-        total_cupos = sum(tp.get("cupos", 0) for tp in f.get("tipos_productos", []))
-        if total_cupos == 0:
-            total_cupos = f.get("cupos_totales") or f.get("cupos") or 0
-
-        ocupados = sum(1 for a in artesanos if a.get("feria_id") == f.get("id"))
-
-        artesanos_feria = [a for a in artesanos if a.get("feria_id") == f.get("id")]
-        tipos_info = []
-        for tp in f.get("tipos_productos", []):
-            ocupados_tipo = sum(
-                1 for a in artesanos if a.get("feria_id") == f.get("id") and a.get("tipo") == tp.get("tipo")
-            )
-            tipos_info.append({
-                "tipo": tp.get("tipo"),
-                "cupos": tp.get("cupos"),
-                "ocupados": ocupados_tipo
-            })
-        ferias_detalles.append({
-            "id": f.get("id"),
-            "nombre": f.get("nombre", f"Feria {f.get('id')}"),
-            "fecha_inicio": f.get("fecha_inicio", ""),
-            "fecha_fin": f.get("fecha_fin", ""),
-            "ocupados": ocupados,
-            "total_cupos": total_cupos,
-            "preferencias": f.get("preferencias", ""),
-            "tipos": tipos_info,
-            "artesanos": artesanos_feria
-        })
+    # --------- GET: solo se arma la pestaña pedida (el resto se carga al abrirla) ---------
+    tab = request.GET.get("tab")
+    if tab not in ADMIN_TABS:
+        tab = "crear-feria"
+    contexto = _admin_tab_contexto(request, tab)
+
+    if request.GET.get("parcial"):
+        return render(request, ADMIN_TABS[tab], contexto)
+
+    contexto["tabs"] = ADMIN_TABS
+    contexto["tab_template"] = ADMIN_TABS[tab]
+    return render(request, "admin/admin_panel.html", contexto)
+
+
+# pestaña del panel admin -> template parcial que la dibuja
+ADMIN_TABS = {
+    "crear-feria": "admin/tabs/crear_feria.html",
+    "solicitudes": "admin/tabs/solicitudes.html",
+    "ferias-registradas": "admin/tabs/ferias.html",
+    "artesanos-registrados": "admin/tabs/artesanos.html",
+    "usuarios": "admin/tabs/usuarios.html",
+    "archivo": "admin/tabs/archivo.html",
+}
+ADMIN_POR_PAGINA = 25
+
+ORDEN_FERIAS = {
+    "id": lambda f: int(f.get("id", 0)),
+    "nombre": lambda f: (f.get("nombre") or "").lower(),
+    "fecha_inicio": lambda f: f.get("fecha_inicio") or "",
+}
+ORDEN_USUARIOS = {"username", "email", "role", "date_joined", "last_login"}
+
+
+def _paginar(request, objetos):
+    """Página pedida en ?page= (tamaño en ?por_pagina=, máx. 100)."""
+    try:
+        por_pagina = max(1, min(int(request.GET.get("por_pagina", ADMIN_POR_PAGINA)), 100))
+    except ValueError:
+        por_pagina = ADMIN_POR_PAGINA
+    return Paginator(objetos, por_pagina).get_page(request.GET.get("page"))
+
+
+def _admin_tab_contexto(request, tab):
+    """Contexto de UNA pestaña del panel admin: filtros del querystring + página de resultados."""
+    g = request.GET
+    filtros = {k: g.get(k, "") for k in ("q", "estado", "feria", "tipo", "rol", "orden", "anio", "ver")}
+    querystring = g.copy()
+    for k in ("page", "parcial"):
+        querystring.pop(k, None)
+    querystring["tab"] = tab
+
+    contexto = {"tab": tab, "filtros": filtros, "querystring": querystring.urlencode()}
+
+    if tab == "crear-feria":
+        contexto["feria_form"] = FeriaForm()
+        contexto["tipo_formset"] = TipoProductoFormSet(prefix="tipos")
+        return contexto
+
+    if tab == "usuarios":
+        orden = filtros["orden"] or "-date_joined"
+        if orden.lstrip("-") not in ORDEN_USUARIOS:
+            orden = "-date_joined"
+        users = User.objects.all()
+        if filtros["rol"]:
+            users = users.filter(role=filtros["rol"])
+        if filtros["q"]:
+            users = users.filter(Q(username__icontains=filtros["q"]) | Q(email__icontains=filtros["q"]))
+        contexto["page_obj"] = _paginar(request, users.order_by(orden, "id"))
+        contexto["roles"] = User.ROLE_CHOICES
+        return contexto
+
+    if tab == "archivo":
+        # ferias terminadas y solicitudes viejas, por año (no están en el documento de trabajo)
+        anios = archivo.anios()
+        anio = int(filtros["anio"]) if filtros["anio"].isdigit() else None
+        if anio not in anios:
+            anio = anios[0] if anios else None
+        ver = filtros["ver"] if filtros["ver"] in archivo.COLECCIONES else "ferias"
+        q = filtros["q"].strip().lower()
+        registros = archivo.leer(anio)[ver] if anio else []
+        registros = [x for x in registros if not q or q in (x.get("nombre") or "").lower()]
+        contexto.update(anios=anios, anio=anio, ver=ver, page_obj=_paginar(request, registros[::-1]))
+        return contexto
+
+    contexto["ferias_opciones"] = utils.opciones_ferias()["ferias"]
+    contexto["tipos_opciones"] = sorted({t for tipos in utils.ferias_tipos_map().values() for t in tipos})
+
+    if tab == "solicitudes":
+        contexto["estados"] = ("pendiente", "aceptado", "rechazado")
+        contexto["page_obj"] = _paginar(request, utils.listar_solicitudes(
+            estado=filtros["estado"], feria_id=filtros["feria"], tipo=filtros["tipo"], orden=filtros["orden"],
+        ))
+    elif tab == "artesanos-registrados":
+        contexto["page_obj"] = _paginar(request, utils.listar_artesanos(
+            q=filtros["q"], feria_id=filtros["feria"], tipo=filtros["tipo"], orden=filtros["orden"],
+        ))
+    elif tab == "ferias-registradas":
+        q = filtros["q"].strip().lower()
+        ferias = [f for f in utils.ferias() if not q or q in (f.get("nombre") or "").lower()]
+        orden = filtros["orden"] or "fecha_inicio"
+        if orden.lstrip("-") not in ORDEN_FERIAS:
+            orden = "fecha_inicio"
+        ferias.sort(key=ORDEN_FERIAS[orden.lstrip("-")], reverse=orden.startswith("-"))
+        page_obj = _paginar(request, ferias)
+
+        # Detalles (ocupación, favoritas) solo de la página visible
+        favoritas = utils.conteo_favoritas()
+        detalles = []
+        for f in page_obj.object_list:
+            detalle = utils.feria_detalle(f)
+            detalle["favoritas"] = favoritas.get(f.get("id"), 0)
+            detalles.append(detalle)
+        page_obj.object_list = detalles
+        contexto["page_obj"] = page_obj
+    return contexto
 
-        ferias_disponibles.append(
-            (f.get("id"), f"{f.get('nombre', f'Feria {f.get('id')}')} ({ocupados}/{total_cupos} cupos)")
-        )
+@login_required
+@require_POST
+def moderar_solicitudes_view(request):
+    """
+    Moderación en lote: POST con varios solicitud_ids y accion=aprobar|rechazar.
+    Se aplica todo en una sola escritura y se devuelve un reporte por ítem
+    (JSON si se pide con Accept: application/json; si no, mensajes + redirect).
+    """
+    if request.user.role != "admin":
+        return redirect('user_panel' if request.user.role == 'user' else 'artesano_panel')
 
-    # Datos para el JS de tipos por feria
-    ferias_tipos = {}
-    for f in ferias:
-        fid = str(f.get("id"))
-        tipos_info = []
-        for tp in f.get("tipos_productos", []):
-            ocupados_tipo = sum(1 for a in artesanos if a.get("feria_id") == f.get("id") and a.get("tipo") == tp.get("tipo"))
-            tipos_info.append({
-                "tipo": tp.get("tipo"),
-                "cupos": tp.get("cupos"),
-                "ocupados": ocupados_tipo
-            })
-        ferias_tipos[fid] = tipos_info
+    quiere_json = "application/json" in request.headers.get("Accept", "")
+    ids = [int(x) for x in request.POST.getlist("solicitud_ids") if x.strip().isdigit()]
+    accion = request.POST.get("accion", "")
+
+    if not ids:
+        if quiere_json:
+            return JsonResponse({"error": "No seleccionaste solicitudes."}, status=400)
+        messages.info(request, "No seleccionaste solicitudes.")
+        return redirect("admin_panel")
+
+    try:
+        resultados = utils.moderar_solicitudes(ids, accion)
+    except ValueError as e:
+        if quiere_json:
+            return JsonResponse({"error": str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect("admin_panel")
+
+    correctas = sum(1 for r in resultados if r["ok"])
+    if quiere_json:
+        return JsonResponse({
+            "accion": accion,
+            "procesadas": len(resultados),
+            "correctas": correctas,
+            "resultados": resultados,
+        })
+
+    verbo = "aprobadas" if accion == "aprobar" else "rechazadas"
+    messages.success(request, f"{correctas} de {len(resultados)} solicitudes {verbo}.")
+    for r in resultados:
+        if not r["ok"]:
+            messages.error(request, f"Solicitud {r['id']}: {r['mensaje']}")
+    return redirect("admin_panel")
 
-    return render(request, "admin/admin_panel.html", {
-        "ferias": ferias_detalles,
-        "artesanos": artesanos,
-        "feria_form": feria_form,
-        "artesano_form": artesano_form,  # opcional
-        "tipo_formset": tipo_formset,
-        "ferias_disponibles": ferias_disponibles,
-        "ferias_tipos_json": json.dumps(ferias_tipos),
-        "solicitudes": solicitudes,  # 👈 para la pestaña de solicitudes
-        "users": users,
-    })
 
 @login_required
 def edit_user_view(request, user_id):
@@ -482,20 +499,14 @@ def edit_user_view(request, user_id):
 # =================== Otras vistas existentes ===================
 
 def editar_feria(request, feria_id):
-    data = utils.load_data()
     feria_id = int(feria_id)
-    feria = next((f for f in data["ferias"] if f["id"] == feria_id), None)
+    feria = utils.buscar("ferias", feria_id)
 
     if not feria:
         messages.error(request, "La feria no existe.")
         return redirect("admin_panel")
 
     if request.method == "POST":
-        feria["nombre"] = request.POST.get("nombre", "").strip()
-        feria["fecha_inicio"] = request.POST.get("fecha_inicio")
-        feria["fecha_fin"] = request.POST.get("fecha_fin")
-        feria["preferencias"] = request.POST.get("preferencias", "")
-
         total_tipos = int(request.POST.get("tipos-TOTAL_FORMS", 0))
         nuevos_tipos = []
         for i in range(total_tipos):
@@ -504,10 +515,13 @@ def editar_feria(request, feria_id):
             if tipo and cupos:
                 nuevos_tipos.append({"tipo": tipo, "cupos": int(cupos)})
 
-        feria["tipos_productos"] = nuevos_tipos
-        feria["cupos_totales"] = sum(tp["cupos"] for tp in nuevos_tipos)
-
-        utils.save_data(data)
+        utils.edit_feria(feria_id, {
+            "nombre": request.POST.get("nombre", "").strip(),
+            "fecha_inicio": request.POST.get("fecha_inicio"),
+            "fecha_fin": request.POST.get("fecha_fin"),
+            "preferencias": request.POST.get("preferencias", ""),
+            "tipos_productos": nuevos_tipos,
+        })
         messages.success(request, "Feria actualizada correctamente")
         return redirect("admin_panel")
 
@@ -517,66 +531,231 @@ def editar_feria(request, feria_id):
     })
 
 
-def public_view(request):
-    data = utils.load_data()
-    ferias = data.get("ferias", [])
-    artesanos = data.get("artesanos", [])
-
-    ferias_detalles = []
-    ferias_dict = {}
-    for f in ferias:
-        total_cupos = sum(tp.get("cupos", 0) for tp in f.get("tipos_productos", []))
-        if total_cupos == 0:
-            total_cupos = f.get("cupos_totales") or f.get("cupos") or 0
-
-        ocupados = sum(1 for a in artesanos if a.get("feria_id") == f.get("id"))
-
-        tipos_info = []
-        for tp in f.get("tipos_productos", []):
-            ocupados_tipo = sum(
-                1 for a in artesanos if a.get("feria_id") == f.get("id") and a.get("tipo") == tp.get("tipo")
-            )
-            tipos_info.append({
-                "tipo": tp.get("tipo"),
-                "cupos_totales": tp.get("cupos"),
-                "ocupados": ocupados_tipo
-            })
+PUBLIC_CACHE_TIMEOUT = 600
 
-        feria_data = {
-            "id": f.get("id"),
-            "nombre": f.get("nombre", f"Feria {f.get('id')}"),
-            "fecha_inicio": f.get("fecha_inicio", ""),
-            "fecha_fin": f.get("fecha_fin", ""),
-            "ocupados": ocupados,
-            "total_cupos": total_cupos,
-            "preferencias": f.get("preferencias", ""),
-            "tipos": tipos_info
-        }
-        ferias_detalles.append(feria_data)
-        ferias_dict[f.get("id")] = feria_data
 
-    busqueda = request.GET.get("busqueda", "").strip().lower()
-    artesanos_filtrados = []
+def _public_etag(request):
+    """
+    Sin búsqueda la página depende solo de los datos: el resto del querystring no entra
+    en la clave (si no, cada ?x=N sería otra copia cacheada).
+    """
+    if request.GET.get("busqueda"):
+        return None
+    version, _ = utils.version_datos()
+    return hashlib.md5(f"{version}".encode()).hexdigest()
 
-    if busqueda:
-        for a in artesanos:
-            if busqueda in a.get("nombre", "").lower() or busqueda in a.get("tipo", "").lower():
-                feria = ferias_dict.get(a.get("feria_id"))
-                artesanos_filtrados.append({**a, "feria": feria})
 
-    artesanos_por_feria = {}
-    for a in artesanos:
-        fid = a.get("feria_id")
-        artesanos_por_feria.setdefault(fid, []).append(a)
+def _public_last_modified(request):
+    if request.GET.get("busqueda"):
+        return None
+    return utils.version_datos()[1]
 
-    return render(request, "usuario_sin_registrar/public.html", {
+
+@condition(etag_func=_public_etag, last_modified_func=_public_last_modified)
+def public_view(request):
+    # Página completa cacheada para anónimos; cualquier cambio de datos cambia la clave
+    clave = None
+    if not request.GET.get("busqueda"):
+        if not request.user.is_authenticated:
+            clave = f"public:{_public_etag(request)}"
+            html = cache.get(clave)
+            if html is not None:
+                response = HttpResponse(html)
+                patch_cache_control(response, no_cache=True)
+                return response
+
+    ferias_detalles = [utils.feria_detalle(f) for f in utils.ferias()]
+    ferias_dict = {f["id"]: f for f in ferias_detalles}
+
+    busqueda = request.GET.get("busqueda", "").strip()
+    resultados = None
+    if busqueda:
+        # índice de texto (sin tildes, por prefijo, ordenado por relevancia); solo se arma la página visible
+        resultados = Paginator(utils.buscar_texto(busqueda), BUSQUEDA_POR_PAGINA).get_page(request.GET.get("page"))
+        productos = Producto.objects.select_related("artesano").in_bulk(
+            [rid for clase, rid, _ in resultados if clase == "producto"]
+        )
+        pagina = []
+        for clase, rid, _ in resultados:
+            if clase == "artesano":
+                a = utils.buscar("artesanos", rid)
+                if a:
+                    pagina.append({**a, "clase": clase, "feria": ferias_dict.get(a.get("feria_id"))})
+            elif clase == "feria":
+                if rid in ferias_dict:
+                    pagina.append({**ferias_dict[rid], "clase": clase})
+            elif rid in productos:
+                p = productos[rid]
+                pagina.append({
+                    "clase": clase, "id": p.id, "nombre": p.nombre,
+                    "descripcion": p.descripcion, "artesano": p.artesano.nombre, "producto": p,
+                })
+        resultados.object_list = pagina
+
+    response = render(request, "usuario_sin_registrar/public.html", {
+        "version_datos": utils.version_datos()[0],
+        "cache_timeout": PUBLIC_CACHE_TIMEOUT,
         "ferias": ferias_detalles,
-        "artesanos": artesanos,
         "busqueda": busqueda,
-        "artesanos_filtrados": artesanos_filtrados,
-        "artesanos_por_feria": json.dumps(artesanos_por_feria),
-        
+        "resultados": resultados,
     })
+    if not busqueda:
+        # el navegador/proxy puede guardarla pero revalida (ETag) antes de usarla
+        patch_cache_control(response, no_cache=True)
+        if clave:
+            cache.set(clave, response.content, PUBLIC_CACHE_TIMEOUT)
+    return response
+
+BUSQUEDA_POR_PAGINA = 20
+
+
+# =================== API JSON (solo lectura) ===================
+# Respuestas cacheadas por versión de datos + URL; ETag/Last-Modified para que
+# los clientes que consultan seguido reciban 304 (ver condition()).
+
+API_CAMPOS_FERIA = (
+    "id", "nombre", "fecha_inicio", "fecha_fin", "preferencias",
+    "ocupados", "total_cupos", "tipos", "artesanos_url",
+)
+
+
+def _api_campos(request):
+    """Campos pedidos en ?fields=a,b,c (todos si no se pide ninguno)."""
+    pedidos = [c.strip() for c in request.GET.get("fields", "").split(",") if c.strip()]
+    invalidos = [c for c in pedidos if c not in API_CAMPOS_FERIA]
+    if invalidos:
+        raise ValueError(f"Campos no válidos: {', '.join(invalidos)}")
+    return pedidos or list(API_CAMPOS_FERIA)
+
+
+def _api_parametros(request):
+    """Solo los parámetros que usan las vistas de la API, normalizados (para la clave de caché)."""
+    g = request.GET
+    try:
+        page = max(1, int(g.get("page", 1)))
+    except ValueError:
+        page = 1
+    try:
+        por_pagina = max(1, min(int(g.get("por_pagina", ADMIN_POR_PAGINA)), 100))
+    except ValueError:
+        por_pagina = ADMIN_POR_PAGINA
+    campos = ",".join(c.strip() for c in g.get("fields", "").split(",") if c.strip())
+    return f"page={page}&por_pagina={por_pagina}&fields={campos}"
+
+
+def _api_etag(request, feria_id=None):
+    """None si la feria pedida no existe (la vista responde 404 sin ETag)."""
+    if feria_id is not None and not utils.buscar("ferias", feria_id):
+        return None
+    version, _ = utils.version_datos()
+    return hashlib.md5(f"{version}:{request.path}?{_api_parametros(request)}".encode()).hexdigest()
+
+
+def _api_last_modified(request, feria_id=None):
+    return utils.version_datos()[1]
+
+
+def _api_json(etag, construir):
+    cuerpo = cache.get(f"api:{etag}")
+    if cuerpo is None:
+        cuerpo = construir()
+        cache.set(f"api:{etag}", cuerpo, PUBLIC_CACHE_TIMEOUT)
+    response = JsonResponse(cuerpo)
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def _api_pagina(page_obj):
+    return {
+        "page": page_obj.number,
+        "num_pages": page_obj.paginator.num_pages,
+        "count": page_obj.paginator.count,
+        "next": page_obj.next_page_number() if page_obj.has_next() else None,
+    }
+
+
+def _api_feria(f, campos):
+    detalle = utils.feria_detalle(f)
+    detalle["artesanos_url"] = reverse("api_feria_artesanos", args=[detalle["id"]])
+    return {c: detalle[c] for c in campos}
+
+
+@require_GET
+@condition(etag_func=_api_etag, last_modified_func=_api_last_modified)
+def api_ferias(request):
+    """Ferias con tipos, cupos y ocupados, paginadas (?page=, ?por_pagina=) y con ?fields=."""
+    try:
+        campos = _api_campos(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    def construir():
+        page_obj = _paginar(request, utils.ferias())
+        return {"ferias": [_api_feria(f, campos) for f in page_obj], **_api_pagina(page_obj)}
+
+    return _api_json(_api_etag(request), construir)
+
+
+@require_GET
+@condition(etag_func=_api_etag, last_modified_func=_api_last_modified)
+def api_feria(request, feria_id):
+    """Una feria (mismos campos y ?fields= que el listado)."""
+    try:
+        campos = _api_campos(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    etag = _api_etag(request, feria_id)
+    if etag is None:
+        return JsonResponse({"error": "Feria no encontrada"}, status=404)
+    return _api_json(etag, lambda: _api_feria(utils.buscar("ferias", feria_id), campos))
+
+
+@require_GET
+@condition(etag_func=_api_etag, last_modified_func=_api_last_modified)
+def api_feria_artesanos(request, feria_id):
+    """
+    Artesanos de UNA feria en JSON, paginados (?page=, ?por_pagina=).
+    Las páginas lo piden al mostrar la feria en vez de traer todos los artesanos embebidos.
+    """
+    etag = _api_etag(request, feria_id)
+    if etag is None:
+        return JsonResponse({"error": "Feria no encontrada"}, status=404)
+
+    def construir():
+        page_obj = _paginar(request, utils.listar_artesanos(feria_id=feria_id, orden="id"))
+        return {
+            "feria_id": feria_id,
+            "artesanos": [
+                {"id": a["id"], "nombre": a.get("nombre", ""), "tipo": a.get("tipo", ""),
+                 "descripcion": a.get("descripcion", "")}
+                for a in page_obj
+            ],
+            **_api_pagina(page_obj),
+        }
+
+    return _api_json(etag, construir)
+
+
+@require_GET
+@condition(etag_func=_api_etag, last_modified_func=_api_last_modified)
+def api_artesanos(request):
+    """Todos los artesanos aprobados (con el nombre de su feria), paginados (?page=, ?por_pagina=)."""
+
+    def construir():
+        page_obj = _paginar(request, utils.listar_artesanos(orden="id"))
+        nombres = {int(f["id"]): f.get("nombre", "") for f in utils.ferias()}
+        return {
+            "artesanos": [
+                {"id": a["id"], "nombre": a.get("nombre", ""), "tipo": a.get("tipo", ""),
+                 "descripcion": a.get("descripcion", ""), "feria_id": a.get("feria_id"),
+                 "feria": nombres.get(int(a.get("feria_id") or 0), "")}
+                for a in page_obj
+            ],
+            **_api_pagina(page_obj),
+        }
+
+    return _api_json(_api_etag(request), construir)
+
 
 @login_required
 def delete_artesano_view(request, artesano_id):
@@ -594,9 +773,8 @@ def edit_artesano_view(request, artesano_id):
     if getattr(request.user, "role", "") != "admin":
         return redirect('artesano_panel' if getattr(request.user, "role", "") == "artesano" else 'user_panel')
 
-    data = utils.load_data()
     # Busca el artesano en tu JSON
-    artesano = next((a for a in data.get("artesanos", []) if str(a.get("id")) == str(artesano_id)), None)
+    artesano = utils.buscar("artesanos", artesano_id)
     if not artesano:
         messages.error(request, "El artesano no existe.")
         return redirect("admin_panel")
@@ -628,35 +806,156 @@ def edit_artesano_view(request, artesano_id):
 
 from .forms import ArtesanoPerfilForm, ProductoFormSet
 from .models import Artesano, Producto
+from . import busqueda, imagenes
 from django import forms
+from django.db import transaction as db_transaction
+from django.core.files.storage import default_storage
+
+MEDIA_MAX_AGE = 60 * 60 * 24 * 365
+
+
+@require_GET
+def media_producto(request, nombre):
+    """
+    Variantes de las fotos de productos (imagenes.py). El nombre lleva el hash del
+    contenido y nunca cambia: el navegador (o un CDN delante) la guarda un año.
+    """
+    try:
+        foto = default_storage.open(f"{imagenes.CARPETA}/{nombre}", "rb")
+    except FileNotFoundError:
+        raise Http404("Foto no encontrada")
+    response = FileResponse(foto)
+    patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE, immutable=True)
+    return response
+
 
 class PerfilSimpleForm(forms.ModelForm):
     class Meta:
         model = Artesano
         fields = ['nombre', 'descripcion']
 
+def _validar_foto(archivo):
+    try:
+        imagenes.validar(archivo)
+    except ValueError as e:
+        raise forms.ValidationError(str(e))
+
+
+def _foto_producto(producto, archivo):
+    """Procesa la foto (ver imagenes.py) y la deja en el producto. Devuelve la foto anterior (base, anchos)."""
+    anterior = (producto.imagen, list(producto.imagen_anchos))
+    producto.imagen, producto.imagen_anchos, producto.imagen_alto = imagenes.procesar(archivo)
+    return anterior
+
+
 class ProductoSimpleForm(forms.ModelForm):
+    foto = forms.FileField(required=False, widget=forms.ClearableFileInput(attrs={"accept": "image/*"}))
+
     class Meta:
         model = Producto
         fields = ['nombre', 'descripcion']
 
+    def clean_foto(self):
+        archivo = self.cleaned_data.get("foto")
+        if archivo:
+            _validar_foto(archivo)  # se procesa al guardar (_guardar_productos)
+        return archivo
+
+
+class _ProductoId(forms.ModelChoiceField):
+    """Campo id del formset que resuelve contra los productos ya cargados (sin un SELECT por fila)."""
+
+    def __init__(self, objetos, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.objetos = objetos
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.objetos[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages["invalid_choice"], code="invalid_choice")
+
+
+class ProductoBaseFormSet(forms.BaseModelFormSet):
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        campo = form.fields[self._pk_field.name]
+        if not hasattr(self, "_productos"):
+            self._productos = {p.pk: p for p in self.get_queryset()}  # el queryset se evalúa una sola vez
+        form.fields[self._pk_field.name] = _ProductoId(
+            self._productos, campo.queryset, initial=campo.initial, required=False, widget=campo.widget,
+        )
+
+def _guardar_productos(artesano, productos_formset, nuevo=None, nueva_foto=None):
+    """
+    Guarda el formset de productos con una consulta por tipo de cambio (no una por producto):
+    bulk_update de los editados, un DELETE para los marcados y bulk_create de los nuevos.
+    Las fotos (ya validadas) se procesan recién aquí; las reemplazadas se borran al confirmar
+    y, si el guardado falla, se borran las recién escritas (las que no usa ningún producto).
+    """
+    cambiados = productos_formset.save(commit=False)
+    editados = [p for p in cambiados if p.pk]
+    nuevos = [p for p in cambiados if not p.pk]
+    if nuevo is not None:
+        nuevos.append(nuevo)
+    for p in nuevos:
+        p.artesano = artesano
+
+    reemplazadas, escritas = [], []
+    try:
+        for form in productos_formset.forms:
+            foto = form.cleaned_data.get("foto")
+            if foto and form not in productos_formset.deleted_forms:
+                reemplazadas.append(_foto_producto(form.instance, foto))
+                escritas.append((form.instance.imagen, list(form.instance.imagen_anchos)))
+        if nuevo is not None and nueva_foto:
+            _foto_producto(nuevo, nueva_foto)
+            escritas.append((nuevo.imagen, list(nuevo.imagen_anchos)))
+
+        with db_transaction.atomic():
+            db_transaction.on_commit(lambda: imagenes.borrar(reemplazadas))
+            if editados:
+                Producto.objects.bulk_update(editados, ["nombre", "descripcion", "imagen", "imagen_anchos", "imagen_alto"])
+            if productos_formset.deleted_objects:
+                Producto.objects.filter(pk__in=[p.pk for p in productos_formset.deleted_objects]).delete()
+            if nuevos:
+                Producto.objects.bulk_create(nuevos)
+    except Exception:
+        imagenes.borrar(escritas)
+        raise
+    # bulk_* no manda post_save: el índice de búsqueda se pone al día a mano
+    busqueda.productos_guardados(editados + nuevos, artesano.nombre)
+
+
 @login_required
 def editar_perfil_artesano(request):
     artesano, _ = Artesano.objects.get_or_create(usuario=request.user)
-    productos = Producto.objects.filter(artesano=artesano)
-    ProductoFormSet = forms.modelformset_factory(Producto, form=ProductoSimpleForm, extra=0, can_delete=True)
+    productos = Producto.objects.filter(artesano=artesano).order_by("id")
+    ProductoFormSet = forms.modelformset_factory(
+        Producto, form=ProductoSimpleForm, formset=ProductoBaseFormSet, extra=0, can_delete=True,
+    )
 
     if request.method == 'POST':
         perfil_form = PerfilSimpleForm(request.POST, instance=artesano)
-        productos_formset = ProductoFormSet(request.POST, queryset=productos)
-        if perfil_form.is_valid() and productos_formset.is_valid():
-            perfil_form.save()
-            productos_formset.save()
-            # Para agregar un producto nuevo
-            nuevo_nombre = request.POST.get('nuevo_producto_nombre', '').strip()
-            nuevo_desc = request.POST.get('nuevo_producto_desc', '').strip()
-            if nuevo_nombre:
-                Producto.objects.create(artesano=artesano, nombre=nuevo_nombre, descripcion=nuevo_desc)
+        productos_formset = ProductoFormSet(request.POST, request.FILES, queryset=productos)
+        valido = perfil_form.is_valid() and productos_formset.is_valid()
+        # Para agregar un producto nuevo
+        nuevo_nombre = request.POST.get('nuevo_producto_nombre', '').strip()
+        nuevo_desc = request.POST.get('nuevo_producto_desc', '').strip()
+        nuevo = Producto(nombre=nuevo_nombre, descripcion=nuevo_desc) if nuevo_nombre else None
+        nueva_foto = request.FILES.get('nuevo_producto_imagen') if nuevo is not None else None
+        if valido and nueva_foto:
+            try:
+                _validar_foto(nueva_foto)
+            except forms.ValidationError as e:
+                perfil_form.add_error(None, e)
+                valido = False
+        if valido:
+            if perfil_form.has_changed():
+                perfil_form.save()
+            _guardar_productos(artesano, productos_formset, nuevo, nueva_foto)
             return redirect('artesano_panel')
     else:
         perfil_form = PerfilSimpleForm(instance=artesano)